@@ -42,6 +42,15 @@ cp todoist_api.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
 cp requirements.txt $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
 cp yougile_api.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
 cp yandex_gpt.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp speech_backends.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp task_backends.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp message_coalescer.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp profiler.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp circuit_breaker.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp cached_directory.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp project_picker.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp todoist_replica.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
+cp due_parser.py $BUILD_DIR/debian/usr/local/bin/$PACKAGE_NAME/
 
 # Делаем скрипты исполняемыми
 chmod 755 $BUILD_DIR/debian/DEBIAN/postinst
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+
+def save_json(path: Optional[str], data: Any, description: str) -> None:
+    """
+    Атомарно сохранить data в JSON-файл: пишем во временный файл и подменяем им основной,
+    чтобы при сбое на диске не осталось полузаписанного файла. Ошибка записи только логируется.
+    Args:
+        path (str, optional): путь к файлу; без него ничего не сохраняется
+        data: данные для json.dump
+        description (str): что сохраняется, для сообщения в логе («очередь задач»)
+    """
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить {description} {path}: {e}")
+
+
+def normalize_name(name: str) -> str:
+    """Ключ для поиска по названию: без регистра, пробелов по краям и кавычек"""
+    return name.strip().strip('"\'«»').strip().lower()
+
+
+class CachedDirectory:
+    """
+    Основа для локальных справочников трекеров (проекты, доски, колонки).
+    Данные загружаются целиком один раз, хранятся в памяти с индексами, обновляются в фоне
+    по истечении TTL и сохраняются на диск, чтобы после перезапуска не ходить в API.
+    Наследники реализуют _fetch() (загрузка из API) и _index() (построение индексов).
+    """
+    title = "directory"
+
+    def __init__(self, ttl: int = 3600, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            ttl (int): время жизни справочника в секундах
+            snapshot_path (str, optional): путь к JSON-снимку на диске
+        """
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.data: Dict[str, List[Dict[str, Any]]] = {}
+        self._index({})
+
+    def _fetch(self) -> Dict[str, List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _index(self, data: Dict[str, List[Dict[str, Any]]]) -> None:
+        raise NotImplementedError
+
+    def _describe(self) -> str:
+        return ", ".join(f"{len(items)} {kind}" for kind, items in self.data.items())
+
+    def refresh(self) -> None:
+        """Загрузить справочник из API и сохранить снимок на диск"""
+        data = self._fetch()
+        with self._lock:
+            self._index(data)
+            self.data = data
+            self.loaded_at = time.time()
+        save_json(self.snapshot_path, {"loaded_at": self.loaded_at, "data": self.data},
+                  f"снимок справочника {self.title}")
+        logging.info(f"{self.title} directory refreshed: {self._describe()}")
+
+    def load_snapshot(self) -> bool:
+        """Загрузить справочник из снимка на диске. Возвращает True, если снимок найден"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать снимок справочника {self.title}: {e}")
+            return False
+        with self._lock:
+            self._index(snapshot.get("data", {}))
+            self.data = snapshot.get("data", {})
+            self.loaded_at = snapshot.get("loaded_at", 0.0)
+        return True
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            logging.warning(f"Не удалось обновить справочник {self.title}: {e}")
+        finally:
+            self._refreshing = False
+
+    def ensure_fresh(self) -> None:
+        """
+        Гарантирует, что справочник загружен. Первая загрузка синхронная (из снимка или API),
+        а устаревший справочник обновляется в фоне — запросы продолжают обслуживаться из памяти.
+        """
+        if not self.loaded_at and not self.load_snapshot():
+            self.refresh()
+            return
+        with self._lock:
+            if time.time() - self.loaded_at <= self.ttl or self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
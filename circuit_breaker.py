@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён без обращения к сервису: предохранитель разомкнут"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Считается ли ошибка отказом сервиса. Ошибки запроса (4xx, кроме 429) — не отказ:
+    сервис жив, просто отклонил конкретные данные.
+    """
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, (requests.exceptions.RequestException, CircuitOpenError))
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для одного внешнего сервиса (closed → open → half-open → closed).
+
+    В состоянии closed ведёт скользящее окно последних вызовов: плохим считается вызов,
+    завершившийся отказом сервиса или дольше slow_call_seconds. Когда доля плохих вызовов
+    в окне достигает failure_rate, предохранитель размыкается и вызовы сразу завершаются
+    CircuitOpenError. Через open_seconds фоновая проба (если задана) проверяет сервис и замыкает
+    предохранитель; без пробы один следующий вызов пропускается как пробный (half-open).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        open_seconds: float = 30.0,
+        probe: Optional[Callable[[], Any]] = None
+    ):
+        """
+        Args:
+            name (str): название сервиса (для логов и сообщений)
+            window (int): размер скользящего окна вызовов
+            min_calls (int): минимум вызовов в окне, после которого предохранитель может разомкнуться
+            failure_rate (float): доля плохих вызовов, при которой предохранитель размыкается
+            slow_call_seconds (float): вызов дольше этого считается плохим
+            open_seconds (float): сколько держать предохранитель разомкнутым до пробы
+            probe (callable, optional): лёгкая проверка сервиса; исключение — сервис недоступен
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.probe = probe
+        self._window = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.probe is None and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """Можно ли сейчас обращаться к сервису (без учёта пробного вызова)"""
+        return self.state != OPEN
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнить func через предохранитель
+        Raises:
+            CircuitOpenError: если предохранитель разомкнут
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._trial_running):
+                raise CircuitOpenError(self.name)
+            trial = state == HALF_OPEN
+            if trial:
+                self._trial_running = True
+
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._record(is_upstream_failure(e), trial)
+            raise
+        self._record(time.monotonic() - started > self.slow_call_seconds, trial)
+        return result
+
+    def _record(self, bad: bool, trial: bool) -> None:
+        with self._lock:
+            if trial:
+                self._trial_running = False
+                if bad:
+                    self._open()
+                else:
+                    self._close()
+                return
+            if self._state != CLOSED:
+                return
+            self._window.append(bad)
+            if len(self._window) >= self.min_calls and sum(self._window) / len(self._window) >= self.failure_rate:
+                self._open()
+
+    def _open(self) -> None:
+        # Вызывается под self._lock
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        logger.warning(f"Circuit {self.name} opened: failing fast for {self.open_seconds:.0f} s")
+        if self.probe is not None:
+            threading.Thread(target=self._probe_loop, name=f"probe-{self.name}", daemon=True).start()
+
+    def _close(self) -> None:
+        # Вызывается под self._lock
+        self._state = CLOSED
+        self._window.clear()
+        logger.info(f"Circuit {self.name} closed: service is healthy again")
+
+    def _probe_loop(self) -> None:
+        """Фоновая проверка сервиса, пока предохранитель разомкнут"""
+        while True:
+            time.sleep(self.open_seconds)
+            try:
+                self.probe()
+            except Exception as e:
+                logger.info(f"Health probe for {self.name} failed: {e}")
+                continue
+            with self._lock:
+                if self._state != CLOSED:
+                    self._close()
+            return
+
+
+def http_request(method: str, url: str, breaker: Optional[CircuitBreaker] = None,
+                 timeout: Optional[float] = None, **kwargs) -> requests.Response:
+    """
+    HTTP-запрос с таймаутом и, если задан, через предохранитель.
+    Ответы 5xx и 429 поднимают HTTPError, чтобы предохранитель учитывал их как отказ сервиса.
+    """
+    def send() -> requests.Response:
+        response = requests.request(method, url, timeout=timeout, **kwargs)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return response
+
+    if breaker is None:
+        return send()
+    return breaker.call(send)
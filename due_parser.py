@@ -0,0 +1,237 @@
+import calendar
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Dict, Tuple
+
+# Повторяющиеся сроки («каждый понедельник») разбирает только сам Todoist
+RECURRING_RE = re.compile(r"\b(кажд\w*|ежедн\w*|еженед\w*|ежемес\w*|every|daily|weekly|monthly|yearly)\b")
+
+WEEKDAYS = (
+    ("понедельн", "пн", "monday", "mon"),
+    ("вторн", "вт", "tuesday", "tue"),
+    ("сред", "ср", "wednesday", "wed"),
+    ("четверг", "чт", "thursday", "thu"),
+    ("пятниц", "пт", "friday", "fri"),
+    ("суббот", "сб", "saturday", "sat"),
+    ("воскресен", "вс", "sunday", "sun"),
+)
+MONTHS = (
+    ("январ", "january", "jan"),
+    ("феврал", "february", "feb"),
+    ("март", "march", "mar"),
+    ("апрел", "april", "apr"),
+    ("ма[йяе]", "may"),
+    ("июн", "june", "jun"),
+    ("июл", "july", "jul"),
+    ("август", "august", "aug"),
+    ("сентябр", "september", "sep"),
+    ("октябр", "october", "oct"),
+    ("ноябр", "november", "nov"),
+    ("декабр", "december", "dec"),
+)
+NUMBER_WORDS = {
+    "один": 1, "одну": 1, "одна": 1, "a": 1, "an": 1, "one": 1,
+    "два": 2, "две": 2, "two": 2, "три": 3, "three": 3, "четыре": 4, "four": 4,
+    "пять": 5, "five": 5, "шесть": 6, "six": 6, "семь": 7, "seven": 7, "десять": 10, "ten": 10,
+}
+# Служебные слова, которые могут остаться вокруг разобранных частей («до 14.06», «в пятницу»)
+FILLER_WORDS = {"в", "во", "на", "до", "к", "ко", "по", "числа", "года", "г", "at", "on", "by", "until", "the", "of"}
+
+_WEEKDAY_ALT = "|".join(f"{stems[0]}\\w*|{stems[1]}|{stems[2]}|{stems[3]}" for stems in WEEKDAYS)
+_MONTH_ALT = "|".join("|".join(f"{stem}\\w*" if i == 0 else stem for i, stem in enumerate(stems)) for stems in MONTHS)
+_NUMBER_ALT = "|".join(NUMBER_WORDS)
+
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[./](\d{1,2})(?:[./](\d{4}|\d{2}))?\b")
+DAY_MONTH_RE = re.compile(rf"\b(\d{{1,2}})\s+({_MONTH_ALT})(?:\s+(\d{{4}}))?\b")
+MONTH_DAY_RE = re.compile(rf"\b({_MONTH_ALT})\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:\s+(\d{{4}}))?\b")
+RELATIVE_DAY_RE = re.compile(r"\b(послезавтра|day after tomorrow|завтра|tomorrow|сегодня|today)\b")
+SHIFT_RE = re.compile(
+    rf"\b(?:через|in)\s+(?:(\d+|{_NUMBER_ALT}|пол)\s*)?"
+    r"(минут\w*|мин|час\w*|дн\w*|день|сут\w*|недел\w*|месяц\w*|год\w*|лет|"
+    r"minutes?|mins?|hours?|days?|weeks?|months?|years?)\b"
+)
+HALF_HOUR_RE = re.compile(r"\b(?:через|in)\s+(?:полчаса|half an hour)\b")
+NEXT_WEEK_RE = re.compile(r"\b(?:(?:на\s+)?следующ\w+\s+недел\w+|next\s+week)\b")
+WEEKDAY_RE = re.compile(rf"\b(?:(следующ\w+|next)\s+)?({_WEEKDAY_ALT})\b")
+CLOCK_RE = re.compile(r"\b(\d{1,2}):(\d{2})\s*(утра|дня|вечера|ночи|am|pm)?(?!\w)")
+HOUR_RE = re.compile(r"\b(?:в|к|at)\s+(\d{1,2})(?:\.(\d{2}))?(?:\s+час\w*)?\s*(утра|дня|вечера|ночи|am|pm)?(?!\w)")
+HOUR_SUFFIX_RE = re.compile(r"\b(\d{1,2})\s*(am|pm)\b")
+NOON_RE = re.compile(r"\b(?:в\s+)?(полдень|noon)\b")
+
+
+def _month_number(word: str) -> int:
+    for number, stems in enumerate(MONTHS, start=1):
+        if any(re.fullmatch(f"{stem}\\w*" if i == 0 else stem, word) for i, stem in enumerate(stems)):
+            return number
+    raise ValueError(word)
+
+
+def _weekday_number(word: str) -> int:
+    for number, stems in enumerate(WEEKDAYS):
+        if word.startswith(stems[0]) or word in stems[1:]:
+            return number
+    raise ValueError(word)
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _make_date(today: date, day: int, month: int, year: Optional[str]) -> Optional[date]:
+    """Дата без года — ближайшая в будущем (или сегодня)"""
+    try:
+        if year:
+            return date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+        result = date(today.year, month, day)
+        return result if result >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def _make_time(hour: int, minute: int, part: Optional[str]) -> Optional[time]:
+    if part in ("дня", "вечера", "pm") and hour < 12:
+        hour += 12
+    elif part in ("ночи", "am") and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+class _Expression:
+    """Остаток разбираемой строки: каждая распознанная часть вырезается из него"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def take(self, pattern: re.Pattern, valid=None) -> Optional[re.Match]:
+        for match in pattern.finditer(self.text):
+            if valid is None or valid(match):
+                self.text = f"{self.text[:match.start()]} {self.text[match.end():]}"
+                return match
+        return None
+
+    def rest(self) -> str:
+        return " ".join(word for word in self.text.split() if word not in FILLER_WORDS)
+
+
+def _parse_day(expr: _Expression, today: date) -> Tuple[Optional[date], bool]:
+    """Дата из выражения; второй элемент — False, если дата указана, но некорректна"""
+    match = expr.take(ISO_DATE_RE)
+    if match:
+        return _make_date(today, int(match[3]), int(match[2]), match[1]), True
+    match = expr.take(NUMERIC_DATE_RE, lambda m: _make_date(today, int(m[1]), int(m[2]), m[3]) is not None)
+    if match:
+        return _make_date(today, int(match[1]), int(match[2]), match[3]), True
+    match = expr.take(DAY_MONTH_RE)
+    if match:
+        day = _make_date(today, int(match[1]), _month_number(match[2]), match[3])
+        return day, day is not None
+    match = expr.take(MONTH_DAY_RE)
+    if match:
+        day = _make_date(today, int(match[2]), _month_number(match[1]), match[3])
+        return day, day is not None
+    match = expr.take(RELATIVE_DAY_RE)
+    if match:
+        offset = {"сегодня": 0, "today": 0, "завтра": 1, "tomorrow": 1}.get(match[1], 2)
+        return today + timedelta(days=offset), True
+    match = expr.take(NEXT_WEEK_RE)
+    if match:
+        return today + timedelta(days=7 - today.weekday()), True
+    match = expr.take(WEEKDAY_RE)
+    if match:
+        ahead = (_weekday_number(match[2]) - today.weekday()) % 7
+        if match[1] and ahead == 0:
+            ahead = 7
+        return today + timedelta(days=ahead), True
+    return None, True
+
+
+def _parse_time(expr: _Expression) -> Tuple[Optional[time], bool]:
+    """Время из выражения; второй элемент — False, если время указано, но некорректно"""
+    match = expr.take(CLOCK_RE) or expr.take(HOUR_RE)
+    if match:
+        clock = _make_time(int(match[1]), int(match[2] or 0), match[3])
+        return clock, clock is not None
+    match = expr.take(HOUR_SUFFIX_RE)
+    if match:
+        clock = _make_time(int(match[1]), 0, match[2])
+        return clock, clock is not None
+    if expr.take(NOON_RE):
+        return time(12, 0), True
+    return None, True
+
+
+def _parse_shift(expr: _Expression, now: datetime):
+    """Сдвиг «через N …»: возвращает datetime (для минут и часов), date или None"""
+    if expr.take(HALF_HOUR_RE):
+        return now + timedelta(minutes=30)
+    match = expr.take(SHIFT_RE)
+    if not match:
+        return None
+    amount, unit = match[1], match[2]
+    if amount == "пол":
+        count = 0.5
+    elif amount is None:
+        count = 1
+    else:
+        count = int(amount) if amount.isdigit() else NUMBER_WORDS[amount]
+    if unit.startswith(("мин", "min")):
+        return now + timedelta(minutes=count)
+    if unit.startswith(("час", "hour")):
+        return now + timedelta(hours=count)
+    if count != int(count):
+        return False
+    count = int(count)
+    if unit.startswith(("дн", "ден", "сут", "day")):
+        return now.date() + timedelta(days=count)
+    if unit.startswith(("недел", "week")):
+        return now.date() + timedelta(weeks=count)
+    if unit.startswith(("месяц", "month")):
+        return _add_months(now.date(), count)
+    return _add_months(now.date(), 12 * count)
+
+
+def normalize_due(text: str, now: datetime) -> Optional[Dict[str, str]]:
+    """
+    Разбирает срок на русском или английском («послезавтра», «в пятницу в 18:00», «через 2 недели»,
+    «до 14.06», «June 14 at 6pm») в поля Todoist без обращения к API.
+    Args:
+        text (str): срок естественным языком (due_string из LLM)
+        now (datetime): текущее время с часовым поясом пользователя
+    Returns:
+        dict: {"due_date": "YYYY-MM-DD"} или {"due_datetime": "...Z" в UTC};
+        None, если выражение разобрано не полностью (тогда его разбирает Todoist)
+    """
+    text = re.sub(r"[,;!?]", " ", text.lower().replace("ё", "е")).strip()
+    if not text or RECURRING_RE.search(text):
+        return None
+    expr = _Expression(text)
+    today = now.date()
+
+    shift = _parse_shift(expr, now)
+    day, day_ok = _parse_day(expr, today)
+    clock, clock_ok = _parse_time(expr)
+    if shift is False or not day_ok or not clock_ok or expr.rest():
+        return None
+
+    if isinstance(shift, datetime):
+        if day or clock:
+            return None
+        moment = shift.replace(second=0, microsecond=0)
+    elif shift is not None:
+        if day:
+            return None
+        day = shift
+    if not isinstance(shift, datetime):
+        if clock is None:
+            return {"due_date": day.isoformat()} if day else None
+        if day is None:
+            # Только время — сегодня, а если оно уже прошло, завтра
+            day = today if clock > now.time() else today + timedelta(days=1)
+        moment = datetime.combine(day, clock, tzinfo=now.tzinfo)
+    return {"due_datetime": moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
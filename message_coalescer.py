@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatState:
+    def __init__(self):
+        self.last_arrival = float("-inf")
+        self.pending: List[Any] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+class MessageCoalescer:
+    """
+    Группирует сообщения одного чата, пришедшие подряд, чтобы обработать их одним вызовом.
+    Окно адаптивное: одиночное сообщение отдаётся в обработку сразу, без задержки;
+    если следующее приходит быстрее, чем через window_ms, сообщения копятся,
+    пока поток не стихнет на window_ms или не наберётся max_batch штук.
+    """
+
+    def __init__(
+        self,
+        window_ms: int,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        max_batch: int = 10
+    ):
+        """
+        Args:
+            window_ms (int): окно группировки в миллисекундах
+            handler: корутина, получающая список элементов группы (в порядке поступления)
+            max_batch (int): максимальный размер группы
+        """
+        self.window = window_ms / 1000
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self._chats: Dict[Hashable, _ChatState] = {}
+        # Храним ссылки на запущенные обработки, иначе asyncio может собрать их сборщиком мусора
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, key: Hashable, item: Any) -> None:
+        """
+        Добавить сообщение в группу чата key. Возвращается сразу:
+        обработка выполняется в фоне, чтобы не задерживать приём следующих сообщений.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._chats.setdefault(key, _ChatState())
+        now = loop.time()
+        burst = now - state.last_arrival < self.window
+        state.last_arrival = now
+
+        if not burst and not state.pending:
+            self._run([item])
+            return
+
+        state.pending.append(item)
+        if state.flush_handle is not None:
+            state.flush_handle.cancel()
+            state.flush_handle = None
+        if len(state.pending) >= self.max_batch:
+            self._flush(key)
+        else:
+            state.flush_handle = loop.call_later(self.window, self._flush, key)
+
+    def _flush(self, key: Hashable) -> None:
+        state = self._chats.get(key)
+        if state is None or not state.pending:
+            return
+        batch, state.pending = state.pending, []
+        state.flush_handle = None
+        self._run(batch)
+
+    def _run(self, batch: List[Any]) -> None:
+        task = asyncio.create_task(self.handler(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error processing message batch: {task.exception()}")
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional, List, Tuple
+
+# Модули, которые считаются «горячим путём» бота: свой код, API-клиенты и HTTP-стек
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+HTTP_STACK_PACKAGES = ("requests", "urllib3", "httpx", "httpcore", "telegram", "anyio")
+HTTP_STACK_MODULES = ("ssl.py", "socket.py")
+# Потоки, стоящие в этих модулях, простаивают (ждут событий или работы) — в топ их не берём
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+def _is_focus(filename: str) -> bool:
+    if os.path.dirname(os.path.abspath(filename)) == PROJECT_DIR:
+        return True
+    parts = filename.replace("\\", "/").split("/")
+    return any(package in parts for package in HTTP_STACK_PACKAGES) or parts[-1] in HTTP_STACK_MODULES
+
+
+def _is_idle(frame) -> bool:
+    return os.path.basename(frame.f_code.co_filename) in IDLE_MODULES
+
+
+def _thread_stack(frame) -> List:
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _coroutine_stack(coro) -> List:
+    """Цепочка кадров приостановленной корутины: от внешней корутины задачи до точки await"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class ProfileReport:
+    """Результат профилирования: свёрнутые стеки и счётчики по функциям и точкам await"""
+
+    def __init__(self, duration: float, samples: int, stacks: Counter,
+                 self_counts: Counter, total_counts: Counter, await_counts: Counter):
+        self.duration = duration
+        self.samples = samples
+        self.stacks = stacks
+        self.self_counts = self_counts
+        self.total_counts = total_counts
+        self.await_counts = await_counts
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed-stack (flamegraph.pl, speedscope, inferno)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 10) -> str:
+        def percent(count: int) -> str:
+            return f"{100 * count / self.samples:.0f}%" if self.samples else "0%"
+
+        lines = [f"Профиль за {self.duration:.1f} с, {self.samples} сэмплов"]
+        lines.append("\nСамые горячие функции (своё время / с вызовами):")
+        for label, count in self.self_counts.most_common(top):
+            lines.append(f"  {percent(count)} / {percent(self.total_counts[label])}  {label}")
+        if self.await_counts:
+            lines.append("\nГде ждут асинхронные задачи:")
+            for label, count in self.await_counts.most_common(top):
+                lines.append(f"  {percent(count)}  {label}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профайлер живого процесса.
+    Отдельный поток с заданным интервалом снимает стеки всех потоков (sys._current_frames)
+    и цепочки корутин asyncio-задач. В простое ничего не запущено и профайлер ничего не стоит.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        """
+        Args:
+            interval (float): интервал между сэмплами в секундах
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(
+        self,
+        seconds: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        ignore_task: Optional[asyncio.Task] = None
+    ) -> ProfileReport:
+        """
+        Профилирует процесс seconds секунд. Блокирующий вызов — запускайте его в отдельном потоке.
+        Args:
+            seconds (float): длительность профилирования
+            loop: цикл asyncio, задачи которого тоже нужно сэмплировать
+            ignore_task: задача, ожидающая сам профайлер (её не показываем в отчёте)
+        Raises:
+            RuntimeError: если профилирование уже идёт
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Профилирование уже запущено")
+        try:
+            return self._sample(seconds, loop, ignore_task)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, loop: Optional[asyncio.AbstractEventLoop],
+                ignore_task: Optional[asyncio.Task]) -> ProfileReport:
+        stacks: Counter = Counter()
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        await_counts: Counter = Counter()
+        own_thread = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+
+        while time.monotonic() < deadline:
+            samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = _thread_stack(frame)
+                self._account(f"thread:{thread_names.get(thread_id, thread_id)}", frames,
+                              stacks, self_counts, total_counts)
+            if loop is not None:
+                for task_name, frames in self._task_stacks(loop, ignore_task):
+                    stacks[";".join([f"task:{task_name}"] + [_frame_label(f) for f in frames])] += 1
+                    # Точка ожидания — самый глубокий await в нашем коде или HTTP-стеке
+                    focus = [f for f in frames if _is_focus(f.f_code.co_filename)]
+                    if focus:
+                        await_counts[f"{_frame_label(focus[-1])}:{focus[-1].f_lineno}"] += 1
+            time.sleep(self.interval)
+
+        return ProfileReport(time.monotonic() - started, samples, stacks, self_counts, total_counts, await_counts)
+
+    @staticmethod
+    def _account(root: str, frames: List, stacks: Counter, self_counts: Counter, total_counts: Counter) -> None:
+        if not frames:
+            return
+        labels = [_frame_label(f) for f in frames]
+        stacks[";".join([root] + labels)] += 1
+        if _is_idle(frames[-1]):
+            return
+        # Для топа берём только кадры горячего пути; рекурсию считаем один раз на сэмпл
+        focus = [label for f, label in zip(frames, labels) if _is_focus(f.f_code.co_filename)]
+        for label in set(focus):
+            total_counts[label] += 1
+        if focus:
+            self_counts[focus[-1]] += 1
+
+    @staticmethod
+    def _task_stacks(loop: asyncio.AbstractEventLoop, ignore_task: Optional[asyncio.Task]) -> List[Tuple[str, List]]:
+        result = []
+        try:
+            tasks = asyncio.all_tasks(loop)
+        except RuntimeError:
+            return result
+        for task in tasks:
+            # Выполняющаяся сейчас корутина уже видна в стеке потока цикла
+            coro = task.get_coro()
+            if task is ignore_task or task.done() or getattr(coro, "cr_running", False):
+                continue
+            frames = _coroutine_stack(coro)
+            if frames:
+                result.append((task.get_name(), frames))
+        return result
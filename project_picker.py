@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+from cached_directory import save_json
+
+logger = logging.getLogger(__name__)
+
+# Префикс callback_data кнопок выбора проекта: pk:<бэкенд>:<ключ места>
+CALLBACK_PREFIX = "pk"
+# Telegram ограничивает callback_data 64 байтами
+CALLBACK_DATA_LIMIT = 64
+BUTTON_LABEL_LIMIT = 32
+
+
+class UsageStats:
+    """
+    Локальная статистика, куда пользователь отправляет задачи: счётчик по каждому месту
+    (проект, колонка) отдельно для пользователя и бэкенда. Хранится в JSON-файле.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (str, optional): путь к файлу статистики; без него статистика живёт только в памяти
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Запись на диск идёт под отдельной блокировкой, чтобы top() не ждал её
+        self._save_lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, Counter]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._counts = {
+                    user: {backend: Counter(counts) for backend, counts in by_backend.items()}
+                    for user, by_backend in data.items()
+                }
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"Не удалось прочитать статистику выбора проектов {path}: {e}")
+
+    def record(self, user_id: int, backend: str, key: str) -> None:
+        """Учесть выбор места и переписать файл статистики (блокирует — вызывать вне цикла событий)"""
+        with self._lock:
+            self._counts.setdefault(str(user_id), {}).setdefault(backend, Counter())[key] += 1
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                counts = {user: {name: dict(c) for name, c in by_backend.items()}
+                          for user, by_backend in self._counts.items()}
+            save_json(self.path, counts, "статистику выбора проектов")
+
+    def top(self, user_id: int, backend: str) -> List[str]:
+        """Ключи мест пользователя по убыванию частоты"""
+        with self._lock:
+            counts = self._counts.get(str(user_id), {}).get(backend, Counter())
+            return [key for key, _ in counts.most_common()]
+
+
+class ProjectPicker:
+    """
+    Кнопки выбора проекта под ответом о созданной задаче.
+    Раскладка кнопок для каждой пары (пользователь, бэкенд) строится заранее из статистики и справочника
+    и пересобирается только когда меняется статистика или обновляется справочник, поэтому
+    показ клавиатуры не стоит ни одного запроса к API.
+    """
+
+    def __init__(self, backends: List[Any], stats: UsageStats, size: int = 6, per_row: int = 2,
+                 max_messages: int = 500):
+        """
+        Args:
+            backends (List[TaskBackend]): подключённые трекеры
+            stats (UsageStats): статистика выбора мест
+            size (int): сколько кнопок показывать для одного бэкенда
+            per_row (int): кнопок в ряду
+            max_messages (int): сколько последних ответов помнить для обработки нажатий
+        """
+        self.backends = {backend.name: backend for backend in backends}
+        self.stats = stats
+        self.size = max(1, size)
+        self.per_row = max(1, per_row)
+        self.max_messages = max_messages
+        # Название бэкенда в подписи нужно, только если задача может уйти в несколько трекеров
+        self.prefixed = len(self.backends) > 1
+        self._layouts: Dict[Tuple[int, str], Tuple[float, List[List[InlineKeyboardButton]]]] = {}
+        self._messages: "OrderedDict[Tuple[int, int], Tuple[List[Any], str]]" = OrderedDict()
+
+    def _build(self, user_id: int, backend) -> List[List[InlineKeyboardButton]]:
+        options = dict(backend.picker_options())
+        # Сначала самые частые места пользователя, остаток добираем в порядке справочника
+        keys = [key for key in self.stats.top(user_id, backend.name) if key in options]
+        keys += [key for key in options if key not in keys]
+        buttons = []
+        for key in keys:
+            data = f"{CALLBACK_PREFIX}:{backend.name}:{key}"
+            if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+                continue
+            label = options[key]
+            if len(label) > BUTTON_LABEL_LIMIT:
+                label = label[:BUTTON_LABEL_LIMIT - 1] + "…"
+            if self.prefixed:
+                label = f"{backend.title}: {label}"
+            buttons.append(InlineKeyboardButton(label, callback_data=data))
+            if len(buttons) >= self.size:
+                break
+        return [buttons[i:i + self.per_row] for i in range(0, len(buttons), self.per_row)]
+
+    def _directory_version(self, backend) -> float:
+        directory = getattr(backend, "directory", None)
+        return directory.loaded_at if directory else 0.0
+
+    def rebuild(self, user_id: int, backend_name: str) -> None:
+        """Пересобрать раскладку пользователя для бэкенда (после изменения статистики)"""
+        backend = self.backends[backend_name]
+        self._layouts[(user_id, backend_name)] = (self._directory_version(backend), self._build(user_id, backend))
+
+    def _layout(self, user_id: int, backend) -> List[List[InlineKeyboardButton]]:
+        cached = self._layouts.get((user_id, backend.name))
+        if cached is None or cached[0] != self._directory_version(backend):
+            self.rebuild(user_id, backend.name)
+            cached = self._layouts[(user_id, backend.name)]
+        return cached[1]
+
+    def keyboard(self, user_id: int, results: List[Any]) -> Optional[InlineKeyboardMarkup]:
+        """Клавиатура для ответа: раскладки всех бэкендов, где задача создана"""
+        rows = []
+        for result in results:
+            if result.ok and not result.queued and result.task:
+                rows.extend(self._layout(user_id, result.backend))
+        return InlineKeyboardMarkup(rows) if rows else None
+
+    def record(self, user_id: int, results: List[Any]) -> None:
+        """Учесть, куда попали задачи, и обновить раскладки (пишет статистику на диск)"""
+        for result in results:
+            if result.ok and result.location and result.backend.name in self.backends:
+                self.stats.record(user_id, result.backend.name, result.location)
+                self.rebuild(user_id, result.backend.name)
+
+    def remember(self, chat_id: int, message_id: int, results: List[Any], source: str = "") -> None:
+        """Запомнить задачи ответа, чтобы обработать нажатие кнопки под ним"""
+        self._messages[(chat_id, message_id)] = (results, source)
+        self._messages.move_to_end((chat_id, message_id))
+        while len(self._messages) > self.max_messages:
+            self._messages.popitem(last=False)
+
+    def lookup(self, chat_id: int, message_id: int) -> Optional[Tuple[List[Any], str]]:
+        """Задачи и источник ответа или None, если ответ уже забыт"""
+        return self._messages.get((chat_id, message_id))
+
+    @staticmethod
+    def parse(data: str) -> Optional[Tuple[str, str]]:
+        """Разобрать callback_data в (бэкенд, ключ места)"""
+        prefix, _, rest = data.partition(":")
+        backend, _, key = rest.partition(":")
+        if prefix != CALLBACK_PREFIX or not backend or not key:
+            return None
+        return backend, key
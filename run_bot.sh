@@ -19,8 +19,8 @@ ENV_PATH=".env"
 VENV_PATH="./myenv"
 
 # Требуемые переменные для каждого сервиса
-TODOIST_VARS=(TELEGRAM_TOKEN TODOIST_TOKEN YANDEX_SPEECHKIT_TOKEN YANDEX_GPT_APIKEY YANDEX_FOLDER_ID TELEGRAM_USER_ID SERVICE)
-YOUGILE_VARS=(TELEGRAM_TOKEN YOUGILE_TOKEN YOUGILE_LOCATION YANDEX_SPEECHKIT_TOKEN YANDEX_GPT_APIKEY YANDEX_FOLDER_ID TELEGRAM_USER_ID SERVICE)
+TODOIST_VARS=(TELEGRAM_TOKEN TODOIST_TOKEN YANDEX_GPT_APIKEY YANDEX_FOLDER_ID TELEGRAM_USER_ID SERVICE)
+YOUGILE_VARS=(TELEGRAM_TOKEN YOUGILE_TOKEN YOUGILE_LOCATION YANDEX_GPT_APIKEY YANDEX_FOLDER_ID TELEGRAM_USER_ID SERVICE)
 
 # Парсинг аргументов командной строки
 while [[ $# -gt 0 ]]; do
@@ -62,26 +62,43 @@ source "$ENV_PATH"
 set +o allexport
 
 if [ -z "$SERVICE" ]; then
-    echo "Error: SERVICE is not set in $ENV_PATH (must be 'todoist' or 'yougile')"
+    echo "Error: SERVICE is not set in $ENV_PATH (must be 'todoist', 'yougile' or both, e.g. 'todoist,yougile')"
     exit 1
 fi
 
-if [ "$SERVICE" = "todoist" ]; then
-    for var in "${TODOIST_VARS[@]}"; do
-        if [ -z "${!var}" ] || [[ "${!var}" == "your_"* ]]; then
-            echo "Error: $var is not set in $ENV_PATH (required for todoist)"
-            exit 1
-        fi
-    done
-elif [ "$SERVICE" = "yougile" ]; then
-    for var in "${YOUGILE_VARS[@]}"; do
-        if [ -z "${!var}" ] || [[ "${!var}" == "your_"* ]]; then
-            echo "Error: $var is not set in $ENV_PATH (required for yougile)"
-            exit 1
-        fi
-    done
-else
-    echo "Error: Unknown SERVICE value '$SERVICE' in $ENV_PATH. Use 'todoist' or 'yougile'."
+# SERVICE может содержать несколько сервисов через запятую — проверяем переменные для каждого
+IFS=',' read -ra SERVICES <<< "${SERVICE// /}"
+for service in "${SERVICES[@]}"; do
+    if [ "$service" = "todoist" ]; then
+        for var in "${TODOIST_VARS[@]}"; do
+            if [ -z "${!var}" ] || [[ "${!var}" == "your_"* ]]; then
+                echo "Error: $var is not set in $ENV_PATH (required for todoist)"
+                exit 1
+            fi
+        done
+    elif [ "$service" = "yougile" ]; then
+        for var in "${YOUGILE_VARS[@]}"; do
+            if [ -z "${!var}" ] || [[ "${!var}" == "your_"* ]]; then
+                echo "Error: $var is not set in $ENV_PATH (required for yougile)"
+                exit 1
+            fi
+        done
+    else
+        echo "Error: Unknown SERVICE value '$service' in $ENV_PATH. Use 'todoist' or 'yougile'."
+        exit 1
+    fi
+done
+
+# Токен SpeechKit нужен только если облачное распознавание включено в STT_BACKENDS
+STT_BACKENDS="${STT_BACKENDS:-yandex}"
+if [[ ",${STT_BACKENDS// /}," == *",yandex,"* ]]; then
+    if [ -z "$YANDEX_SPEECHKIT_TOKEN" ] || [[ "$YANDEX_SPEECHKIT_TOKEN" == "your_"* ]]; then
+        echo "Error: YANDEX_SPEECHKIT_TOKEN is not set in $ENV_PATH (required for STT backend yandex)"
+        exit 1
+    fi
+fi
+if [[ ",${STT_BACKENDS// /}," == *",vosk,"* ]] && [ ! -d "$VOSK_MODEL_PATH" ]; then
+    echo "Error: VOSK_MODEL_PATH is not set or not a directory in $ENV_PATH (required for STT backend vosk)"
     exit 1
 fi
 
@@ -1,11 +1,21 @@
 import os
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from todoist_api import TodoistAPI
-from yougile_api import YougileAPI
+import signal
+import time
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from todoist_api import TodoistAPI, TodoistDirectory
+from yougile_api import YougileAPI, YougileDirectory
+from task_backends import TodoistBackend, YougileBackend, TaskRouter, PendingTaskQueue, parse_routing_rules
+from speech_backends import create_speech_recognizer, TranscriptCache
+from message_coalescer import MessageCoalescer
+from profiler import SamplingProfiler
+from project_picker import ProjectPicker, UsageStats, CALLBACK_PREFIX
+from todoist_replica import TodoistReplica
+from circuit_breaker import CircuitBreaker
 import io
-import requests
 # Импортируем класс YandexGPT
 from yandex_gpt import YandexGPT
 
@@ -24,78 +34,127 @@ YOUGILE_TOKEN = os.getenv('YOUGILE_TOKEN')
 YANDEX_GPT_APIKEY = os.getenv('YANDEX_GPT_APIKEY')
 YANDEX_FOLDER_ID = os.getenv('YANDEX_FOLDER_ID')
 ALLOWED_USER_ID = int(os.getenv('TELEGRAM_USER_ID', '0'))  # ID пользователя, которому разрешен доступ
+ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID') or ALLOWED_USER_ID)  # ID администратора (команда /profile)
 
-# Получаем сервис из переменной окружения или по наличию токена
-SERVICE = os.getenv('SERVICE', 'todoist')
+# Получаем список сервисов из переменной окружения (можно несколько через запятую, например todoist,yougile)
+SERVICES = [name.strip() for name in os.getenv('SERVICE', 'todoist').split(',') if name.strip()]
+# Правила маршрутизации задач между сервисами (см. README), по умолчанию задача уходит во все сервисы
+TASK_ROUTES = os.getenv('TASK_ROUTES', '')
+# Режим «сначала создать, потом уточнить»: задача создаётся из исходного текста, LLM работает в фоне
+FAST_CREATE = os.getenv('FAST_CREATE', '0').lower() in ('1', 'true', 'yes')
+# Кнопки выбора проекта под ответом: сколько кнопок на сервис и где хранить статистику выбора
+PROJECT_PICKER = os.getenv('PROJECT_PICKER', '0').lower() in ('1', 'true', 'yes')
+PICKER_SIZE = int(os.getenv('PICKER_SIZE', '6'))
+PICKER_STATS_PATH = os.getenv('PICKER_STATS_PATH', 'picker_stats.json')
+# Локальная реплика задач Todoist для /today, /inbox и /search: интервал синхронизации (0 — выключена) и снимок
+TODOIST_SYNC_SECONDS = int(os.getenv('TODOIST_SYNC_SECONDS', '60'))
+TODOIST_REPLICA_CACHE = os.getenv('TODOIST_REPLICA_CACHE', 'todoist_replica.json')
+# Сколько задач показывать в ответах команд чтения
+TASK_LIST_LIMIT = int(os.getenv('TASK_LIST_LIMIT', '30'))
+# Окно группировки сообщений в миллисекундах (0 — каждое сообщение обрабатывается отдельно)
+COALESCE_WINDOW_MS = int(os.getenv('COALESCE_WINDOW_MS', '0'))
+COALESCE_MAX_BATCH = int(os.getenv('COALESCE_MAX_BATCH', '10'))
+# Профилирование: длительность по умолчанию и по сигналу SIGUSR1, каталог для файлов профиля
+PROFILE_DEFAULT_SECONDS = int(os.getenv('PROFILE_DEFAULT_SECONDS', '10'))
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', '.')
+# Предохранители внешних сервисов: окно вызовов, доля ошибок/медленных вызовов для размыкания, пауза до пробы
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '10'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+# Очередь задач, пока трекер недоступен, и интервал повторных попыток
+TASK_QUEUE_PATH = os.getenv('TASK_QUEUE_PATH', 'pending_tasks.json')
+TASK_QUEUE_RETRY_SECONDS = int(os.getenv('TASK_QUEUE_RETRY_SECONDS', '30'))
+# STT-бэкенды в порядке приоритета: следующий используется, если предыдущий не справился
+STT_BACKENDS = [name.strip() for name in os.getenv('STT_BACKENDS', 'yandex').split(',') if name.strip()]
+STT_LANG = os.getenv('STT_LANG', 'ru-RU')
+# Кэш распознанных голосовых по file_unique_id: размер (0 — выключен) и файл на диске (пусто — только в памяти)
+STT_CACHE_SIZE = int(os.getenv('STT_CACHE_SIZE', '1000'))
+STT_CACHE_PATH = os.getenv('STT_CACHE_PATH', 'stt_cache.json')
 
-if not TELEGRAM_TOKEN or not YANDEX_SPEECHKIT_TOKEN:
-    raise ValueError("TELEGRAM_TOKEN and YANDEX_SPEECHKIT_TOKEN must be set in environment variables")
-if SERVICE == 'todoist' and not TODOIST_TOKEN:
-    raise ValueError("TODOIST_TOKEN must be set in environment variables for todoist mode")
-if SERVICE == 'yougile' and not YOUGILE_TOKEN:
-    raise ValueError("YOUGILE_TOKEN must be set in environment variables for yougile mode")
+if not TELEGRAM_TOKEN:
+    raise ValueError("TELEGRAM_TOKEN must be set in environment variables")
 
 if ALLOWED_USER_ID == 0:
     raise ValueError("TELEGRAM_USER_ID must be set in environment variables")
 
-# Инициализируем клиента только для выбранного сервиса
-client = None
-gpt = None
-if SERVICE == 'todoist':
-    if not TODOIST_TOKEN:
-        raise ValueError("TODOIST_TOKEN must be set in environment variables for todoist mode")
-    # Получаем проект и секцию по умолчанию из переменной окружения
-    default_project_id = os.getenv('TODOIST_DEFAULT_PROJECT_ID')
-    default_section_id = os.getenv('TODOIST_DEFAULT_SECTION_ID')
-    
-    client = TodoistAPI(TODOIST_TOKEN, default_project_id=default_project_id, default_section_id=default_section_id)
-elif SERVICE == 'yougile':
-    if not YOUGILE_TOKEN:
-        raise ValueError("YOUGILE_TOKEN must be set in environment variables for yougile mode")
-    yougile_location = os.getenv('YOUGILE_LOCATION')
-    if not yougile_location:
-        raise ValueError("YOUGILE_LOCATION must be set in environment variables for yougile mode")
-    client = YougileAPI(YOUGILE_TOKEN, location=yougile_location)
-else:
-    raise ValueError("Unknown SERVICE value. Must be 'todoist' or 'yougile'.")
+def make_breaker(name: str, probe=None) -> CircuitBreaker:
+    """Создаёт предохранитель для внешнего сервиса с настройками из окружения"""
+    return CircuitBreaker(
+        name,
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        failure_rate=BREAKER_FAILURE_RATE,
+        slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        probe=probe
+    )
+
+# Инициализируем клиентов только для выбранных сервисов
+backends = []
+replica = None
+for service in SERVICES:
+    if service == 'todoist':
+        if not TODOIST_TOKEN:
+            raise ValueError("TODOIST_TOKEN must be set in environment variables for todoist mode")
+        # Получаем проект и секцию по умолчанию из переменной окружения
+        default_project_id = os.getenv('TODOIST_DEFAULT_PROJECT_ID')
+        default_section_id = os.getenv('TODOIST_DEFAULT_SECTION_ID')
+
+        todoist_client = TodoistAPI(TODOIST_TOKEN, default_project_id=default_project_id, default_section_id=default_section_id)
+        todoist_client.breaker = make_breaker("Todoist", probe=todoist_client.ping)
+        # Справочник проектов и колонок: загружается один раз и обновляется в фоне по TTL
+        todoist_directory = TodoistDirectory(
+            todoist_client,
+            ttl=int(os.getenv('TODOIST_DIRECTORY_TTL', '3600')),
+            snapshot_path=os.getenv('TODOIST_DIRECTORY_CACHE', 'todoist_directory.json')
+        )
+        if TODOIST_SYNC_SECONDS > 0:
+            replica = TodoistReplica(todoist_client, snapshot_path=TODOIST_REPLICA_CACHE)
+        backends.append(TodoistBackend(todoist_client, directory=todoist_directory, replica=replica))
+    elif service == 'yougile':
+        if not YOUGILE_TOKEN:
+            raise ValueError("YOUGILE_TOKEN must be set in environment variables for yougile mode")
+        yougile_location = os.getenv('YOUGILE_LOCATION')
+        if not yougile_location:
+            raise ValueError("YOUGILE_LOCATION must be set in environment variables for yougile mode")
+        yougile_client = YougileAPI(YOUGILE_TOKEN, location=yougile_location)
+        yougile_client.breaker = make_breaker("Yougile", probe=yougile_client.ping)
+        # Справочник досок и колонок: загружается один раз и обновляется в фоне по TTL
+        yougile_directory = YougileDirectory(
+            yougile_client,
+            ttl=int(os.getenv('YOUGILE_DIRECTORY_TTL', '3600')),
+            snapshot_path=os.getenv('YOUGILE_DIRECTORY_CACHE', 'yougile_directory.json')
+        )
+        backends.append(YougileBackend(yougile_client, directory=yougile_directory))
+    else:
+        raise ValueError(f"Unknown SERVICE value '{service}'. Must be 'todoist' or 'yougile'.")
+
+router = TaskRouter(backends, parse_routing_rules(TASK_ROUTES, SERVICES), queue=PendingTaskQueue(TASK_QUEUE_PATH))
+# Раскладки кнопок строятся заранее из статистики и справочников, без запросов к API
+picker = ProjectPicker(backends, UsageStats(PICKER_STATS_PATH), size=PICKER_SIZE) if PROJECT_PICKER else None
 
 # Инициализируем YandexGPT для любого сервиса
 if not YANDEX_GPT_APIKEY or not YANDEX_FOLDER_ID:
     raise ValueError("YANDEX_GPT_APIKEY и YANDEX_FOLDER_ID должны быть заданы в переменных окружения для работы с LLM")
 
-# Передаем клиент в YandexGPT для Todoist
-if SERVICE == 'todoist':
-    gpt = YandexGPT(YANDEX_GPT_APIKEY, YANDEX_FOLDER_ID, todoist_client=client)
-else:
-    gpt = YandexGPT(YANDEX_GPT_APIKEY, YANDEX_FOLDER_ID)
+# Одно извлечение параметров используется всеми сервисами, поэтому id проектов резолвит уже бэкенд
+gpt = YandexGPT(YANDEX_GPT_APIKEY, YANDEX_FOLDER_ID)
+gpt.breaker = make_breaker("YandexGPT", probe=gpt.ping)
 
-def recognize_speech_yandex(audio_path, api_key, folder_id, lang="ru-RU"):
-    """
-    Распознаёт речь с помощью Yandex SpeechKit REST API.
-    :param audio_path: путь к аудиофайлу (ogg, wav, mp3 и др.)
-    :param api_key: API-ключ Yandex Cloud
-    :param folder_id: folder_id Yandex Cloud
-    :param lang: язык (по умолчанию ru-RU)
-    :return: распознанный текст или None
-    """
-    with open(audio_path, "rb") as f:
-        audio_data = f.read()
-    headers = {
-        "Authorization": f"Api-Key {api_key}",
-        "Content-Type": "application/octet-stream",
-    }
-    params = {
-        "folderId": folder_id,
-        "lang": lang
-    }
-    url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
-    response = requests.post(url, headers=headers, params=params, data=audio_data)
-    result = response.json()
-    if result.get("result"):
-        return result["result"]
-    else:
-        print("Ошибка распознавания:", result)
-        return None
+# Инициализируем распознавание речи (модели офлайн-бэкендов загружаются при запуске бота)
+speech = create_speech_recognizer(
+    STT_BACKENDS,
+    speechkit_api_key=YANDEX_SPEECHKIT_TOKEN,
+    folder_id=YANDEX_FOLDER_ID,
+    vosk_model_path=os.getenv('VOSK_MODEL_PATH'),
+    vosk_workers=int(os.getenv('VOSK_WORKERS', '1')),
+    # У SpeechKit нет бесплатной проверки, поэтому после паузы пропускаем один пробный запрос
+    speechkit_breaker=make_breaker("SpeechKit")
+)
+transcripts = TranscriptCache(STT_CACHE_SIZE, STT_CACHE_PATH or None) if STT_CACHE_SIZE > 0 else None
 
 async def check_user(update: Update) -> bool:
     """Проверяет, разрешен ли доступ пользователю"""
@@ -104,126 +163,408 @@ async def check_user(update: Update) -> bool:
         return False
     return True
 
+# Сэмплирующий профайлер: поток сэмплирования запускается только на время профилирования
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILE_INTERVAL_MS', '10')) / 1000)
+
+def services_title() -> str:
+    return " и ".join(backend.title for backend in router.backends.values())
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     if not await check_user(update):
         return
-    if SERVICE == 'todoist':
-        await update.message.reply_text(
-            "Привет! Я бот для создания задач в Todoist.\n"
-            "Просто отправь мне текст или голосовое сообщение, и я создам из него задачу."
-        )
-    elif SERVICE == 'yougile':
-        await update.message.reply_text(
-            "Привет! Я бот для создания задач в Yougile.\n"
-            "Просто отправь мне текст или голосовое сообщение, и я создам из него задачу."
-        )
-    else:
-        await update.message.reply_text("❌ Сервис не настроен. Обратитесь к администратору.")
+    await update.message.reply_text(
+        f"Привет! Я бот для создания задач в {services_title()}.\n"
+        "Просто отправь мне текст или голосовое сообщение, и я создам из него задачу."
+    )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /help"""
     if not await check_user(update):
         return
     
-    await update.message.reply_text(
-        "Я могу создавать задачи в Todoist из:\n"
+    text = (
+        f"Я могу создавать задачи в {services_title()} из:\n"
         "- Текстовых сообщений\n"
         "- Голосовых сообщений\n\n"
         "Просто отправь мне сообщение, и я создам задачу."
     )
+    if replica is not None:
+        text += (
+            "\n\nЗадачи Todoist:\n"
+            "/today — на сегодня и просроченные\n"
+            "/inbox — во «Входящих»\n"
+            "/search <текст> — поиск по задачам"
+        )
+    await update.message.reply_text(text)
+
+def format_delivery_reply(results, source: str = "") -> str:
+    """
+    Формирует ответ пользователю по результатам доставки.
+    :param results: список DeliveryResult
+    :param source: уточнение источника, например " из голосового сообщения"
+    """
+    if len(results) == 1:
+        result = results[0]
+        if result.queued:
+            return f"⏳ {result.backend.title} сейчас недоступен, задача{source} поставлена в очередь и будет создана позже."
+        if not result.ok:
+            return f"❌ Не удалось создать задачу в {result.backend.title}. Попробуйте позже."
+        return f"✅ Задача создана{result.backend.reply_location}{source}{result.info}"
+    lines = [f"Задача{source}:"]
+    for result in results:
+        if result.queued:
+            lines.append(f"⏳ {result.backend.title}: сервис недоступен, задача в очереди")
+        elif result.ok:
+            lines.append(f"✅ {result.backend.title}{result.info}")
+        else:
+            lines.append(f"❌ {result.backend.title}: не удалось создать задачу")
+    return "\n".join(lines)
+
+def picker_keyboard(update: Update, results):
+    """Кнопки выбора проекта для ответа (None, если выбор выключен)"""
+    if picker is None:
+        return None
+    return picker.keyboard(update.effective_user.id, results)
+
+async def remember_reply(update: Update, reply, results, source: str):
+    """Запоминает ответ для обработки нажатий кнопок и учитывает, куда попали задачи"""
+    if picker is None:
+        return
+    picker.remember(reply.chat_id, reply.message_id, results, source)
+    # Статистика сохраняется на диск — не блокируем этим цикл событий
+    await asyncio.to_thread(picker.record, update.effective_user.id, results)
+
+def raw_task_params(text: str):
+    """Параметры задачи из исходного текста, без LLM"""
+    return {"content": text, "description": text}
+
+async def extract_params(batch):
+    """
+    Извлекает параметры всех сообщений группы одним запросом к LLM.
+    :return: (список параметров, примечание для ответа пользователю)
+    """
+    try:
+        params_list = await asyncio.to_thread(gpt.extract_task_params_batch, [text for _, text, _ in batch])
+        return params_list, ""
+    except Exception as e:
+        # LLM недоступна — не теряем задачу, а создаём её из исходного текста
+        logger.warning(f"LLM unavailable, creating tasks from raw text: {e}")
+        return [raw_task_params(text) for _, text, _ in batch], "\nℹ️ YandexGPT недоступна, задача создана из исходного текста."
+
+# Фоновые задачи (уточнение задач в режиме FAST_CREATE): храним ссылки, чтобы их не собрал GC
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def create_first_enrich_later(batch, quote: bool):
+    """
+    Режим минимальной задержки: задача сразу создаётся из исходного текста и бот отвечает,
+    а извлечение параметров через LLM, перенос в проект и обновление ответа идут в фоне.
+    """
+    async def create_raw(update: Update, text: str, source: str):
+        results = await router.deliver(text, raw_task_params(text), chat_id=update.effective_chat.id)
+        reply = await update.message.reply_text(
+            format_delivery_reply(results, source) + "\n⏳ Уточняю детали…", do_quote=quote
+        )
+        return results, reply
+
+    created = await asyncio.gather(*(create_raw(update, text, source) for update, text, source in batch))
+    run_in_background(enrich_created(batch, created))
+
+async def enrich_created(batch, created):
+    """Извлекает параметры созданных задач, уточняет задачи в сервисах и редактирует ответы"""
+    params_list, note = await extract_params(batch)
+
+    async def enrich_one(update: Update, source: str, params, results, reply):
+        try:
+            if not note:
+                results = await router.enrich(results, params)
+            # Кнопки выбора проекта показываем только после уточнения, чтобы перенос из LLM не перебил выбор
+            await reply.edit_text(format_delivery_reply(results, source) + note,
+                                  reply_markup=picker_keyboard(update, results))
+            await remember_reply(update, reply, results, source)
+        except Exception as e:
+            logger.error(f"Error enriching task: {e}")
+
+    await asyncio.gather(*(
+        enrich_one(update, source, params, results, reply)
+        for (update, _, source), params, (results, reply) in zip(batch, params_list, created)
+    ))
+
+async def create_tasks_from_messages(batch):
+    """
+    Создаёт задачи из группы сообщений: параметры всех сообщений извлекаются одним запросом к LLM,
+    затем каждая задача доставляется в подходящие сервисы, а ответ уходит на своё сообщение.
+    :param batch: список кортежей (update, text, source)
+    """
+    # В группе отвечаем цитатой, чтобы было видно, к какому сообщению относится ответ
+    quote = len(batch) > 1
+    if FAST_CREATE:
+        await create_first_enrich_later(batch, quote)
+        return
+    params_list, note = await extract_params(batch)
+
+    async def deliver(update: Update, text: str, source: str, params):
+        results = await router.deliver(text, params, chat_id=update.effective_chat.id)
+        reply = await update.message.reply_text(format_delivery_reply(results, source) + note, do_quote=quote,
+                                                reply_markup=picker_keyboard(update, results))
+        await remember_reply(update, reply, results, source)
+
+    await asyncio.gather(*(
+        deliver(update, text, source, params)
+        for (update, text, source), params in zip(batch, params_list)
+    ))
+
+# Группировка сообщений, пришедших подряд, в один запрос к LLM (выключена при COALESCE_WINDOW_MS=0)
+coalescer = None
+if COALESCE_WINDOW_MS > 0:
+    coalescer = MessageCoalescer(COALESCE_WINDOW_MS, create_tasks_from_messages, max_batch=COALESCE_MAX_BATCH)
+
+async def create_tasks_from_text(update: Update, text: str, source: str = ""):
+    """Извлекает параметры задачи один раз и доставляет её во все подходящие сервисы"""
+    if coalescer:
+        coalescer.submit(update.effective_chat.id, (update, text, source))
+        return
+    await create_tasks_from_messages([(update, text, source)])
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     if not await check_user(update):
         return
     text = update.message.text.strip()
-    if SERVICE == 'todoist':
-        # Извлекаем параметры задачи через LLM (уже с project_id и section_id)
-        params = gpt.extract_todoist_task_params(text)
-        
-        # Формируем информационное сообщение
-        project_info = ""
-        if 'project_id' in params:
-            project = client.get_project_by_id(params['project_id'])
-            if project:
-                project_info = f" в проекте '{project.get('name', 'Неизвестный проект')}'"
-                
-                if 'section_id' in params:
-                    section = client.get_section_by_id(params['section_id'], params['project_id'])
-                    if section:
-                        project_info += f" в колонке '{section.get('name', 'Неизвестная колонка')}'"
-        
-        task = client.create_task(**params)
-        await update.message.reply_text(f"✅ Задача создана{project_info}: {task['content']}")
-    elif SERVICE == 'yougile':
-        params = gpt.extract_yougile_task_params(text)
-        task = client.create_task(**params)
-        await update.message.reply_text(f"✅ Задача создана в Yougile: {params.get('title', text)}")
-    else:
-        await update.message.reply_text("❌ Сервис не настроен. Обратитесь к администратору.")
+    await create_tasks_from_text(update, text)
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик голосовых сообщений"""
     if not await check_user(update):
         return
     try:
-        # Получаем голосовое сообщение
-        voice = await update.message.voice.get_file()
-        # Скачиваем файл
-        voice_ogg = io.BytesIO()
-        await voice.download_to_memory(voice_ogg)
-        voice_ogg.seek(0)
-        # Сохраняем временный файл
-        temp_file = "temp_voice.ogg"
-        with open(temp_file, "wb") as f:
-            f.write(voice_ogg.getvalue())
-        # Распознаём речь через REST API
-        text = recognize_speech_yandex(temp_file, YANDEX_SPEECHKIT_TOKEN, YANDEX_FOLDER_ID)
-        # Удаляем временный файл
-        os.remove(temp_file)
-        if not text:
-            raise ValueError("Не удалось распознать речь")
-        if SERVICE == 'todoist':
-            params = gpt.extract_todoist_task_params(text)
-            
-            # Формируем информационное сообщение
-            project_info = ""
-            if 'project_id' in params:
-                project = client.get_project_by_id(params['project_id'])
-                if project:
-                    project_info = f" в проекте '{project.get('name', 'Неизвестный проект')}'"
-                    
-                    if 'section_id' in params:
-                        section = client.get_section_by_id(params['section_id'], params['project_id'])
-                        if section:
-                            project_info += f" в колонке '{section.get('name', 'Неизвестная колонка')}'"
-            
-            task = client.create_task(**params)
-            await update.message.reply_text(f"✅ Задача создана из голосового сообщения{project_info}: {task['content']}")
-        elif SERVICE == 'yougile':
-            params = gpt.extract_yougile_task_params(text)
-            task = client.create_task(**params)
-            await update.message.reply_text(f"✅ Задача создана в Yougile из голосового сообщения: {params.get('title', text)}")
-        else:
-            await update.message.reply_text("❌ Сервис не настроен. Обратитесь к администратору.")
+        # Пересланное или повторно отправленное голосовое уже распознано — не скачиваем и не распознаём снова
+        file_unique_id = update.message.voice.file_unique_id
+        text = transcripts.get(file_unique_id, STT_LANG) if transcripts else None
+        if text is None:
+            # Получаем голосовое сообщение
+            voice = await update.message.voice.get_file()
+            # Скачиваем файл
+            voice_ogg = io.BytesIO()
+            await voice.download_to_memory(voice_ogg)
+            # Распознаём речь выбранными бэкендами (с fallback)
+            text = await speech.recognize(voice_ogg.getvalue(), STT_LANG)
+            if not text:
+                raise ValueError("Не удалось распознать речь")
+            if transcripts:
+                # put() переписывает файл кэша целиком — не блокируем им цикл событий
+                await asyncio.to_thread(transcripts.put, file_unique_id, text, STT_LANG)
+        await create_tasks_from_text(update, text, " из голосового сообщения")
     except Exception as e:
         logger.error(f"Error processing voice message: {e}")
         await update.message.reply_text("❌ Не удалось обработать голосовое сообщение. Попробуйте позже.")
 
+async def handle_pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки выбора проекта: переносит задачу одним запросом к API"""
+    query = update.callback_query
+    if update.effective_user.id != ALLOWED_USER_ID:
+        await query.answer("⛔️ У вас нет доступа к этому боту.")
+        return
+    parsed = picker.parse(query.data or "")
+    remembered = picker.lookup(query.message.chat_id, query.message.message_id) if parsed else None
+    if remembered is None:
+        await query.answer("Задача уже недоступна для переноса.")
+        return
+    backend_name, key = parsed
+    results, source = remembered
+    index = next((i for i, result in enumerate(results) if result.backend.name == backend_name and result.task), None)
+    if index is None:
+        await query.answer("Задача уже недоступна для переноса.")
+        return
+    try:
+        moved = await asyncio.to_thread(results[index].backend.move_task, results[index], key)
+    except Exception as e:
+        logger.error(f"Error moving task in {results[index].backend.title}: {e}")
+        await query.answer("❌ Не удалось перенести задачу. Попробуйте позже.")
+        return
+    results = results[:index] + [moved] + results[index + 1:]
+    picker.remember(query.message.chat_id, query.message.message_id, results, source)
+    await asyncio.to_thread(picker.record, update.effective_user.id, [moved])
+    await query.answer("Задача перенесена")
+    try:
+        await query.edit_message_text(format_delivery_reply(results, source),
+                                      reply_markup=picker.keyboard(update.effective_user.id, results))
+    except BadRequest as e:
+        # Повторный выбор того же места не меняет сообщение, и Telegram отвечает ошибкой
+        logger.debug(f"Reply was not edited: {e}")
+
+def format_task_list(title: str, tasks) -> str:
+    """Список задач из реплики для ответа на команды чтения"""
+    if not tasks:
+        return f"{title}: задач нет."
+    today = replica.today().isoformat()
+    lines = [f"{title} ({len(tasks)}):"]
+    for task in tasks[:TASK_LIST_LIMIT]:
+        due = replica.due_local(task)
+        line = f"• {task.get('content', '')}"
+        if due[:10] and due[:10] < today:
+            line = f"• 🔴 {due[8:10]}.{due[5:7]} {task.get('content', '')}"
+        elif "T" in due:
+            line = f"• {due[11:16]} {task.get('content', '')}"
+        project = replica.project_name(task.get('project_id'))
+        if project:
+            line += f" — {project}"
+        lines.append(line)
+    if len(tasks) > TASK_LIST_LIMIT:
+        lines.append(f"…и ещё {len(tasks) - TASK_LIST_LIMIT}")
+    return "\n".join(lines)
+
+async def replica_ready(update: Update) -> bool:
+    """Проверяет, что реплика задач включена и уже загружена"""
+    if replica is None:
+        await update.message.reply_text("Команда доступна только для Todoist с включённой синхронизацией (TODOIST_SYNC_SECONDS).")
+        return False
+    if not replica.loaded:
+        await update.message.reply_text("⏳ Загружаю задачи из Todoist, попробуйте через минуту.")
+        return False
+    return True
+
+async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /today: задачи на сегодня и просроченные (из локальной реплики)"""
+    if not await check_user(update) or not await replica_ready(update):
+        return
+    await update.message.reply_text(format_task_list("📅 Сегодня", replica.due_until(replica.today())))
+
+async def inbox_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /inbox: задачи во «Входящих» (из локальной реплики)"""
+    if not await check_user(update) or not await replica_ready(update):
+        return
+    inbox = replica.inbox_project()
+    tasks = replica.in_project(inbox['id']) if inbox else []
+    await update.message.reply_text(format_task_list("📥 Входящие", tasks))
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /search <текст>: поиск по задачам (из локальной реплики)"""
+    if not await check_user(update) or not await replica_ready(update):
+        return
+    query = " ".join(context.args or [])
+    if not query:
+        await update.message.reply_text("Использование: /search <текст> (слова вида @метка ищут по меткам)")
+        return
+    await update.message.reply_text(format_task_list(f"🔎 «{query}»", replica.search(query)))
+
+async def sync_replica(application: Application):
+    """Фоновый цикл: подтягивает изменения задач Todoist в локальную реплику"""
+    while True:
+        try:
+            await asyncio.to_thread(replica.sync)
+        except Exception as e:
+            logger.warning(f"Error syncing Todoist replica: {e}")
+        await asyncio.sleep(TODOIST_SYNC_SECONDS)
+
+async def run_profile(seconds: int):
+    """Профилирует процесс seconds секунд, не блокируя цикл бота; возвращает ProfileReport"""
+    return await asyncio.to_thread(profiler.run, seconds, asyncio.get_running_loop(), asyncio.current_task())
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /profile [секунды] (только для администратора)"""
+    if update.effective_user.id != ADMIN_USER_ID:
+        await update.message.reply_text("⛔️ Команда доступна только администратору.")
+        return
+    try:
+        seconds = int(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("Использование: /profile [секунды]")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    if profiler.running:
+        await update.message.reply_text("⏳ Профилирование уже запущено.")
+        return
+    await update.message.reply_text(f"⏱ Профилирую {seconds} с…")
+    try:
+        report = await run_profile(seconds)
+    except RuntimeError:
+        # Между проверкой и запуском успело начаться профилирование по SIGUSR1
+        await update.message.reply_text("⏳ Профилирование уже запущено.")
+        return
+    await update.message.reply_text(report.summary())
+    await update.message.reply_document(
+        document=io.BytesIO(report.collapsed().encode("utf-8")),
+        filename=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed",
+        caption="Свёрнутые стеки для flamegraph.pl / speedscope"
+    )
+
+async def profile_on_signal():
+    """Профилирование по сигналу SIGUSR1: отчёт пишется в лог, стеки — в файл в PROFILE_DIR"""
+    if profiler.running:
+        logger.warning("SIGUSR1 ignored: profiling is already running")
+        return
+    logger.info(f"SIGUSR1 received, profiling for {PROFILE_DEFAULT_SECONDS} s")
+    try:
+        report = await run_profile(PROFILE_DEFAULT_SECONDS)
+    except RuntimeError:
+        logger.warning("SIGUSR1 ignored: profiling is already running")
+        return
+    path = os.path.join(PROFILE_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(report.collapsed())
+    logger.info(f"{report.summary()}\nCollapsed stacks saved to {path}")
+
+async def retry_pending_tasks(application: Application):
+    """Фоновый цикл: создаёт отложенные задачи, когда трекер снова доступен, и сообщает об этом"""
+    while True:
+        await asyncio.sleep(TASK_QUEUE_RETRY_SECONDS)
+        try:
+            for entry, result in await router.retry_pending():
+                if entry.get("chat_id") is None:
+                    continue
+                if result.ok:
+                    text = f"✅ Отложенная задача создана{result.backend.reply_location}{result.info}"
+                else:
+                    text = f"❌ Не удалось создать отложенную задачу в {result.backend.title}: {entry['params'].get('content', '')}"
+                await application.bot.send_message(entry["chat_id"], text)
+        except Exception as e:
+            logger.error(f"Error retrying pending tasks: {e}")
+
+async def post_init(application: Application):
+    """Регистрирует обработчик SIGUSR1, запускает повтор отложенных задач и синхронизацию реплики"""
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGUSR1, lambda: application.create_task(profile_on_signal()))
+    application.create_task(retry_pending_tasks(application))
+    if replica is not None:
+        application.create_task(sync_replica(application))
+
 def main():
     """Запуск бота"""
     # Создаем приложение
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).build()
 
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    # Профилирование идёт десятки секунд: обработчик не блокирует очередь обновлений,
+    # иначе бот замирает и профиль показывает только простой
+    application.add_handler(CommandHandler("profile", profile_command, block=False))
+    application.add_handler(CommandHandler("today", today_command))
+    application.add_handler(CommandHandler("inbox", inbox_command))
+    application.add_handler(CommandHandler("search", search_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     application.add_handler(MessageHandler(filters.VOICE, handle_voice))
+    if picker is not None:
+        application.add_handler(CallbackQueryHandler(handle_pick, pattern=f"^{CALLBACK_PREFIX}:"))
 
-    # Запускаем бота
-    application.run_polling()
+    # Загружаем модели STT и справочники трекеров заранее, чтобы первое сообщение не ждало
+    speech.start()
+    for backend in router.backends.values():
+        backend.start()
+    # Реплика задач поднимается из снимка, а изменения догружаются в фоне после старта
+    if replica is not None:
+        replica.load_snapshot()
+    try:
+        # Запускаем бота
+        application.run_polling()
+    finally:
+        speech.shutdown()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,275 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import subprocess
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List
+
+from circuit_breaker import CircuitBreaker, http_request
+from cached_directory import save_json
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechBackend:
+    """
+    Базовый интерфейс бэкенда распознавания речи.
+    Наследники реализуют recognize(), который получает аудио (ogg/opus из Telegram)
+    в виде байтов и возвращает распознанный текст или None.
+    """
+    name = "base"
+
+    def start(self) -> None:
+        """Подготовка бэкенда при запуске бота (загрузка модели и т.п.)"""
+
+    def shutdown(self) -> None:
+        """Освобождение ресурсов при остановке бота"""
+
+    async def recognize(self, audio: bytes, lang: str = "ru-RU") -> Optional[str]:
+        raise NotImplementedError
+
+
+class YandexSpeechKitBackend(SpeechBackend):
+    """Распознавание через Yandex SpeechKit REST API (облако)"""
+    name = "yandex"
+
+    def __init__(self, api_key: str, folder_id: str, breaker: Optional[CircuitBreaker] = None, timeout: float = 30):
+        """
+        Args:
+            api_key (str): API-ключ Yandex Cloud
+            folder_id (str): folder_id Yandex Cloud
+            breaker (CircuitBreaker, optional): предохранитель для запросов к SpeechKit
+            timeout (float): таймаут запроса в секундах
+        """
+        self.api_key = api_key
+        self.folder_id = folder_id
+        self.breaker = breaker
+        self.timeout = timeout
+        self.url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
+
+    def recognize_sync(self, audio: bytes, lang: str = "ru-RU") -> Optional[str]:
+        """
+        Распознаёт речь с помощью Yandex SpeechKit REST API.
+        :param audio: содержимое аудиофайла (ogg, wav, mp3 и др.)
+        :param lang: язык (по умолчанию ru-RU)
+        :return: распознанный текст или None
+        """
+        headers = {
+            "Authorization": f"Api-Key {self.api_key}",
+            "Content-Type": "application/octet-stream",
+        }
+        params = {
+            "folderId": self.folder_id,
+            "lang": lang
+        }
+        response = http_request("post", self.url, breaker=self.breaker, timeout=self.timeout,
+                                headers=headers, params=params, data=audio)
+        result = response.json()
+        if result.get("result"):
+            return result["result"]
+        logger.error(f"Ошибка распознавания SpeechKit: {result}")
+        return None
+
+    async def recognize(self, audio: bytes, lang: str = "ru-RU") -> Optional[str]:
+        # requests блокирующий, поэтому уводим вызов в поток, чтобы не держать цикл бота
+        return await asyncio.to_thread(self.recognize_sync, audio, lang)
+
+
+# Модель Vosk живёт в глобальной переменной процесса-воркера:
+# загружается один раз в initializer и дальше переиспользуется всеми вызовами
+_vosk_model = None
+_VOSK_SAMPLE_RATE = 16000
+
+
+def _vosk_worker_init(model_path: str) -> None:
+    global _vosk_model
+    from vosk import Model, SetLogLevel
+    SetLogLevel(-1)
+    _vosk_model = Model(model_path)
+
+
+def _vosk_warmup() -> bool:
+    return _vosk_model is not None
+
+
+def _vosk_recognize(audio: bytes) -> Optional[str]:
+    from vosk import KaldiRecognizer
+    # Telegram присылает ogg/opus, Vosk ждёт 16 кГц mono PCM — декодируем через ffmpeg
+    pcm = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+         "-ar", str(_VOSK_SAMPLE_RATE), "-ac", "1", "-f", "s16le", "pipe:1"],
+        input=audio, stdout=subprocess.PIPE, check=True
+    ).stdout
+    recognizer = KaldiRecognizer(_vosk_model, _VOSK_SAMPLE_RATE)
+    recognizer.AcceptWaveform(pcm)
+    text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+    return text or None
+
+
+class VoskBackend(SpeechBackend):
+    """
+    Офлайн-распознавание на CPU через Vosk.
+    Модель загружается один раз в каждом процессе пула при старте бота и остаётся «тёплой»;
+    само распознавание выполняется в ProcessPoolExecutor и не блокирует цикл бота.
+    """
+    name = "vosk"
+
+    def __init__(self, model_path: str, workers: int = 1):
+        """
+        Args:
+            model_path (str): путь к распакованной модели Vosk
+            workers (int): количество процессов-воркеров
+        """
+        if importlib.util.find_spec("vosk") is None:
+            raise ValueError("Для STT-бэкенда vosk нужен пакет vosk (pip install vosk)")
+        if not os.path.isdir(model_path):
+            raise ValueError(f"Модель Vosk не найдена: {model_path}")
+        self.model_path = model_path
+        self.workers = max(1, workers)
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_vosk_worker_init,
+            initargs=(self.model_path,)
+        )
+        # Прогреваем все воркеры сразу, чтобы первое голосовое не ждало загрузку модели
+        warmups = [self.pool.submit(_vosk_warmup) for _ in range(self.workers)]
+        for future in warmups:
+            future.result()
+        logger.info(f"Vosk: модель {self.model_path} загружена в {self.workers} процесс(а)")
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def recognize(self, audio: bytes, lang: str = "ru-RU") -> Optional[str]:
+        # Язык определяется загруженной моделью, параметр lang здесь не используется
+        if self.pool is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, _vosk_recognize, audio)
+
+
+class SpeechRecognizer:
+    """
+    Распознаёт речь, перебирая бэкенды в порядке приоритета:
+    если бэкенд упал или ничего не распознал, пробуем следующий.
+    """
+
+    def __init__(self, backends: List[SpeechBackend]):
+        if not backends:
+            raise ValueError("Не задан ни один STT-бэкенд")
+        self.backends = backends
+
+    def start(self) -> None:
+        for backend in self.backends:
+            backend.start()
+
+    def shutdown(self) -> None:
+        for backend in self.backends:
+            backend.shutdown()
+
+    async def recognize(self, audio: bytes, lang: str = "ru-RU") -> Optional[str]:
+        for backend in self.backends:
+            try:
+                text = await backend.recognize(audio, lang)
+            except Exception as e:
+                logger.warning(f"STT-бэкенд {backend.name} завершился ошибкой: {e}")
+                continue
+            if text:
+                return text
+            logger.warning(f"STT-бэкенд {backend.name} не распознал речь")
+        return None
+
+
+class TranscriptCache:
+    """
+    LRU-кэш распознанного текста по file_unique_id голосового сообщения Telegram и языку.
+    Пересланные и повторно отправленные голосовые имеют тот же file_unique_id, поэтому для них
+    не нужно ни скачивать файл, ни распознавать речь заново. Кэш можно сохранять на диск.
+    """
+
+    def __init__(self, max_entries: int = 1000, path: Optional[str] = None):
+        """
+        Args:
+            max_entries (int): максимальное количество записей
+            path (str, optional): путь к JSON-файлу кэша; без него кэш живёт только в памяти
+        """
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        # Запись на диск идёт под отдельной блокировкой, чтобы get() не ждал её
+        self._save_lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = OrderedDict(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать кэш распознавания {path}: {e}")
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _key(file_unique_id: str, lang: str) -> str:
+        return f"{file_unique_id}:{lang}"
+
+    def get(self, file_unique_id: str, lang: str = "ru-RU") -> Optional[str]:
+        key = self._key(file_unique_id, lang)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, file_unique_id: str, text: str, lang: str = "ru-RU") -> None:
+        """Запомнить распознанный текст и переписать файл кэша (блокирует — вызывать вне цикла событий)"""
+        key = self._key(file_unique_id, lang)
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                entries = list(self._entries.items())
+            save_json(self.path, entries, "кэш распознавания")
+
+
+def create_speech_recognizer(
+    backend_names: List[str],
+    speechkit_api_key: Optional[str] = None,
+    folder_id: Optional[str] = None,
+    vosk_model_path: Optional[str] = None,
+    vosk_workers: int = 1,
+    speechkit_breaker: Optional[CircuitBreaker] = None
+) -> SpeechRecognizer:
+    """
+    Собирает SpeechRecognizer из списка имён бэкендов (порядок = порядок fallback).
+    Args:
+        backend_names (List[str]): например ["vosk", "yandex"]
+    Raises:
+        ValueError: если бэкенд неизвестен или для него не хватает настроек
+    """
+    backends: List[SpeechBackend] = []
+    for name in backend_names:
+        if name == "yandex":
+            if not speechkit_api_key or not folder_id:
+                raise ValueError("YANDEX_SPEECHKIT_TOKEN и YANDEX_FOLDER_ID должны быть заданы для STT-бэкенда yandex")
+            backends.append(YandexSpeechKitBackend(speechkit_api_key, folder_id, breaker=speechkit_breaker))
+        elif name == "vosk":
+            if not vosk_model_path:
+                raise ValueError("VOSK_MODEL_PATH должен быть задан для STT-бэкенда vosk")
+            backends.append(VoskBackend(vosk_model_path, workers=vosk_workers))
+        else:
+            raise ValueError(f"Unknown STT backend '{name}'. Must be 'yandex' or 'vosk'.")
+    return SpeechRecognizer(backends)
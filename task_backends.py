@@ -0,0 +1,532 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import requests
+
+from todoist_api import TodoistAPI, TodoistDirectory
+from yougile_api import YougileAPI, YougileDirectory
+from circuit_breaker import CircuitOpenError
+from cached_directory import save_json
+
+logger = logging.getLogger(__name__)
+
+# Параметры create_task Todoist, которые можно передавать из результата LLM
+TODOIST_TASK_FIELDS = (
+    "content", "description", "project_id", "section_id", "labels", "priority",
+    "due_string", "due_date", "due_datetime", "due_lang"
+)
+# Поля, которые уточняются у уже созданной задачи (проект и колонка меняются переносом)
+TODOIST_UPDATE_FIELDS = ("content", "labels", "priority", "due_string", "due_date", "due_datetime", "due_lang")
+
+
+class DeliveryResult:
+    """Результат доставки задачи в один бэкенд"""
+
+    def __init__(self, backend: "TaskBackend", task: Optional[Dict[str, Any]] = None,
+                 info: str = "", error: Optional[Exception] = None, queued: bool = False,
+                 location: Optional[str] = None):
+        """
+        Args:
+            backend (TaskBackend): бэкенд, в который доставлялась задача
+            task (dict, optional): данные созданной задачи из API
+            info (str): человекочитаемое описание («в проекте 'Работа': Купить молоко»)
+            error (Exception, optional): ошибка, если задачу создать не удалось
+            queued (bool): сервис недоступен, задача отложена в очередь
+            location (str, optional): ключ места, куда попала задача (см. TaskBackend.picker_options)
+        """
+        self.backend = backend
+        self.task = task
+        self.info = info
+        self.error = error
+        self.queued = queued
+        self.location = location
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class TaskBackend:
+    """
+    Базовый интерфейс трекера задач.
+    Получает общие параметры из YandexGPT.extract_task_params и сам приводит их к формату своего API.
+    """
+    name = "base"
+    title = "Base"
+    # Уточнение места в ответе, когда задача ушла только в этот бэкенд («в Yougile»)
+    reply_location = ""
+
+    def start(self) -> None:
+        """Подготовка бэкенда при запуске бота (прогрев кэшей и т.п.)"""
+
+    @property
+    def available(self) -> bool:
+        """False, если предохранитель клиента разомкнут и запрос точно не пройдёт"""
+        breaker = getattr(getattr(self, "client", None), "breaker", None)
+        return breaker is None or breaker.available
+
+    def create_task(self, params: Dict[str, Any]) -> DeliveryResult:
+        raise NotImplementedError
+
+    def enrich_task(self, task: Dict[str, Any], params: Dict[str, Any]) -> DeliveryResult:
+        """
+        Дополнить уже созданную задачу параметрами из LLM (режим «сначала создать, потом уточнить»)
+        Args:
+            task (dict): данные задачи, созданной из исходного текста
+            params (dict): общие параметры из YandexGPT.extract_task_params
+        """
+        raise NotImplementedError
+
+    def picker_options(self) -> List[Tuple[str, str]]:
+        """
+        Места для кнопок выбора проекта в порядке справочника, без запросов к API
+        Returns:
+            список (ключ места, подпись кнопки); ключ короткий, он уходит в callback_data
+        """
+        return []
+
+    def move_task(self, result: DeliveryResult, key: str) -> DeliveryResult:
+        """
+        Перенести созданную задачу в место key одним запросом к API
+        Args:
+            result (DeliveryResult): результат создания задачи
+            key (str): ключ места из picker_options()
+        """
+        raise NotImplementedError
+
+
+class TodoistBackend(TaskBackend):
+    name = "todoist"
+    title = "Todoist"
+
+    def __init__(self, client: TodoistAPI, directory: Optional[TodoistDirectory] = None, replica=None):
+        """
+        Args:
+            client (TodoistAPI): клиент Todoist
+            directory (TodoistDirectory, optional): справочник проектов и колонок; без него названия ищутся запросами к API
+            replica (TodoistReplica, optional): локальная реплика задач, в которую сразу попадают задачи бота
+        """
+        self.client = client
+        self.directory = directory
+        self.replica = replica
+
+    def _track(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        if self.replica is not None:
+            self.replica.apply_task(task)
+        return task
+
+    def start(self) -> None:
+        # Часовой пояс пользователя нужен для локального разбора сроков
+        self.client.user_timezone()
+        if self.directory:
+            try:
+                self.directory.ensure_fresh()
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить справочник Todoist: {e}")
+
+    def _resolve(self, params: Dict[str, Any]):
+        """Проект и колонка по названиям из LLM и их описание для ответа"""
+        project_name, section_name = params.get('project_name'), params.get('section_name')
+        if self.directory:
+            try:
+                project, section = self.directory.resolve(project_name, section_name)
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить справочник Todoist: {e}")
+                project, section = self.client.resolve_project_and_section(project_name, section_name)
+        else:
+            project, section = self.client.resolve_project_and_section(project_name, section_name)
+        return project, section, self._project_info(project, section)
+
+    @staticmethod
+    def _project_info(project: Optional[Dict[str, Any]], section: Optional[Dict[str, Any]]) -> str:
+        project_info = ""
+        if project:
+            project_info = f" в проекте '{project.get('name', 'Неизвестный проект')}'"
+            if section:
+                project_info += f" в колонке '{section.get('name', 'Неизвестная колонка')}'"
+        return project_info
+
+    @staticmethod
+    def _location(task: Dict[str, Any]) -> Optional[str]:
+        if task.get('section_id'):
+            return f"s:{task['section_id']}"
+        if task.get('project_id'):
+            return f"p:{task['project_id']}"
+        return None
+
+    def create_task(self, params: Dict[str, Any]) -> DeliveryResult:
+        task_params = {key: params[key] for key in TODOIST_TASK_FIELDS if key in params}
+
+        # Преобразуем project_name и section_name в project_id и section_id
+        project, section, project_info = self._resolve(params)
+        if project:
+            task_params['project_id'] = project['id']
+            if section:
+                task_params['section_id'] = section['id']
+
+        task = self._track(self.client.create_task(**task_params))
+        return DeliveryResult(self, task, f"{project_info}: {task['content']}", location=self._location(task))
+
+    def enrich_task(self, task: Dict[str, Any], params: Dict[str, Any]) -> DeliveryResult:
+        project, section, project_info = self._resolve(params)
+        fields = {key: params[key] for key in TODOIST_UPDATE_FIELDS if key in params}
+        updated = self.client.update_task(task['id'], **fields) if fields else task
+        if section and section['id'] != task.get('section_id'):
+            self.client.move_task(task['id'], section_id=section['id'])
+            updated = dict(updated, project_id=section.get('project_id'), section_id=section['id'])
+        elif project and project['id'] != task.get('project_id'):
+            self.client.move_task(task['id'], project_id=project['id'])
+            updated = dict(updated, project_id=project['id'], section_id=None)
+        self._track(updated)
+        return DeliveryResult(self, updated, f"{project_info}: {updated.get('content', task['content'])}",
+                              location=self._location(updated))
+
+    def picker_options(self) -> List[Tuple[str, str]]:
+        if not self.directory:
+            return []
+        options = []
+        for project in self.directory.projects:
+            options.append((f"p:{project['id']}", project.get('name', '')))
+            for section in self.directory.sections_by_project.get(project['id'], []):
+                options.append((f"s:{section['id']}", f"{project.get('name', '')} / {section.get('name', '')}"))
+        return options
+
+    def move_task(self, result: DeliveryResult, key: str) -> DeliveryResult:
+        kind, _, target_id = key.partition(':')
+        task = result.task
+        if kind == "s":
+            section = self.directory.sections_by_id.get(target_id)
+            if not section:
+                raise ValueError(f"Колонка Todoist {target_id} не найдена в справочнике")
+            project = self.directory.project_of(section)
+            self.client.move_task(task['id'], section_id=target_id)
+            moved = dict(task, project_id=section.get('project_id'), section_id=target_id)
+        else:
+            project, section = self.directory.projects_by_id.get(target_id), None
+            if not project:
+                raise ValueError(f"Проект Todoist {target_id} не найден в справочнике")
+            self.client.move_task(task['id'], project_id=target_id)
+            moved = dict(task, project_id=target_id, section_id=None)
+        self._track(moved)
+        return DeliveryResult(self, moved, f"{self._project_info(project, section)}: {task['content']}", location=key)
+
+
+class YougileBackend(TaskBackend):
+    name = "yougile"
+    title = "Yougile"
+    reply_location = " в Yougile"
+
+    def __init__(self, client: YougileAPI, directory: Optional[YougileDirectory] = None):
+        """
+        Args:
+            client (YougileAPI): клиент Yougile
+            directory (YougileDirectory, optional): справочник досок и колонок; без него задачи идут в колонку по умолчанию
+        """
+        self.client = client
+        self.directory = directory
+
+    @staticmethod
+    def make_title(params: Dict[str, Any]) -> str:
+        # Срок в Yougile храним в заголовке в квадратных скобках, как и extract_yougile_task_params
+        title = params.get('title') or params.get('content') or "Новая задача"
+        if params.get('due_string'):
+            title = f"{title} [{params['due_string']}]"
+        return title
+
+    def start(self) -> None:
+        if self.directory:
+            try:
+                self.directory.ensure_fresh()
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить справочник Yougile: {e}")
+
+    def resolve_column(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Колонка по названиям из общего извлечения, без запросов к API:
+        project_name — доска (или проект с одной доской), section_name — колонка
+        """
+        if not self.directory:
+            return None
+        try:
+            return self.directory.resolve_column(params.get('project_name'), params.get('section_name'))
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить справочник Yougile: {e}")
+            return None
+
+    def _location_info(self, column: Optional[Dict[str, Any]]) -> str:
+        if not column:
+            return ""
+        location_info = ""
+        board = self.directory.board_of(column)
+        if board:
+            location_info = f" на доске '{board.get('title', 'Неизвестная доска')}'"
+        return location_info + f" в колонке '{column.get('title', 'Неизвестная колонка')}'"
+
+    def create_task(self, params: Dict[str, Any]) -> DeliveryResult:
+        title = self.make_title(params)
+        column = self.resolve_column(params)
+        column_id = column['id'] if column else self.client.location
+        task = self.client.create_task(
+            title=title,
+            description=params.get('description'),
+            column_id=column_id
+        )
+        # API возвращает только id — название и колонку запоминаем для уточнения и переноса
+        task = dict(task, title=title, columnId=column_id)
+        return DeliveryResult(self, task, f"{self._location_info(column)}: {title}", location=f"c:{column_id}")
+
+    def enrich_task(self, task: Dict[str, Any], params: Dict[str, Any]) -> DeliveryResult:
+        title = self.make_title(params)
+        column = self.resolve_column(params)
+        self.client.update_task(task['id'], title=title, column_id=column['id'] if column else None)
+        task = dict(task, title=title, columnId=column['id'] if column else task.get('columnId'))
+        location = f"c:{task['columnId']}" if task.get('columnId') else None
+        return DeliveryResult(self, task, f"{self._location_info(column)}: {title}", location=location)
+
+    def picker_options(self) -> List[Tuple[str, str]]:
+        if not self.directory:
+            return []
+        options = []
+        for board in self.directory.boards_by_id.values():
+            for column in self.directory.columns_by_board.get(board['id'], []):
+                options.append((f"c:{column['id']}", f"{board.get('title', '')} / {column.get('title', '')}"))
+        return options
+
+    def move_task(self, result: DeliveryResult, key: str) -> DeliveryResult:
+        column = self.directory.columns_by_id.get(key.partition(':')[2])
+        if not column:
+            raise ValueError(f"Колонка Yougile {key} не найдена в справочнике")
+        self.client.update_task(result.task['id'], column_id=column['id'])
+        task = dict(result.task, columnId=column['id'])
+        return DeliveryResult(self, task, f"{self._location_info(column)}: {task.get('title', '')}", location=key)
+
+
+class RoutingRule:
+    """
+    Правило маршрутизации: условие и список бэкендов, в которые уходит задача.
+    Условие — project:<название проекта>, keyword:<слово в тексте> или * (если ни одно правило не подошло).
+    """
+
+    def __init__(self, kind: str, value: str, backends: List[str]):
+        self.kind = kind
+        self.value = value.lower()
+        self.backends = backends
+
+    def matches(self, text: str, params: Dict[str, Any]) -> bool:
+        if self.kind == "project":
+            return (params.get('project_name') or "").strip().lower() == self.value
+        if self.kind == "keyword":
+            return self.value in text.lower()
+        return False
+
+
+def parse_routing_rules(spec: str, known_backends: List[str]) -> List[RoutingRule]:
+    """
+    Разбирает правила вида "project:Работа=todoist; keyword:релиз=yougile,todoist; *=todoist"
+    Raises:
+        ValueError: если правило некорректно или ссылается на неподключённый бэкенд
+    """
+    rules = []
+    for chunk in spec.split(';'):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        condition, sep, targets = chunk.partition('=')
+        if not sep:
+            raise ValueError(f"Некорректное правило маршрутизации '{chunk}': ожидается <условие>=<бэкенды>")
+        condition = condition.strip()
+        backends = [name.strip() for name in targets.split(',') if name.strip()]
+        for name in backends:
+            if name not in known_backends:
+                raise ValueError(f"Правило '{chunk}' ссылается на неподключённый бэкенд '{name}'")
+        if condition == "*":
+            rules.append(RoutingRule("*", "", backends))
+            continue
+        kind, sep, value = condition.partition(':')
+        if not sep or kind not in ("project", "keyword") or not value.strip():
+            raise ValueError(f"Некорректное условие '{condition}': ожидается project:<имя>, keyword:<слово> или *")
+        rules.append(RoutingRule(kind, value.strip(), backends))
+    return rules
+
+
+def _not_created(error: Exception) -> bool:
+    if isinstance(error, (CircuitOpenError, requests.exceptions.ConnectionError)):
+        return True
+    # 429 — сервис отклонил запрос, не выполняя его
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and error.response.status_code == 429)
+
+
+def should_queue(error: Exception) -> bool:
+    """
+    Отложить ли задачу: сервис недоступен и задача точно не создана.
+    Создание задачи неидемпотентно, поэтому после таймаута чтения или 5xx задачу не повторяем —
+    сервис мог успеть её создать, и повтор из очереди дал бы дубль.
+    """
+    return any(_not_created(e) for e in (error, error.__cause__) if e is not None)
+
+
+class PendingTaskQueue:
+    """
+    Очередь задач, которые не удалось создать, пока трекер недоступен.
+    Хранится в JSON-файле, чтобы отложенные задачи пережили перезапуск бота.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (str, optional): путь к файлу очереди; без него очередь живёт только в памяти
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать очередь задач {path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, backend: str, params: Dict[str, Any], chat_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._entries.append({
+                "backend": backend,
+                "params": params,
+                "chat_id": chat_id,
+                "queued_at": time.time(),
+            })
+            save_json(self.path, self._entries, "очередь задач")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._entries)
+
+    def remove(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+                save_json(self.path, self._entries, "очередь задач")
+
+
+class TaskRouter:
+    """
+    Выбирает бэкенды для сообщения по правилам и доставляет в них задачу параллельно.
+    Транскрипт и результат LLM общие для всех бэкендов.
+    """
+
+    def __init__(self, backends: List[TaskBackend], rules: Optional[List[RoutingRule]] = None,
+                 queue: Optional[PendingTaskQueue] = None):
+        """
+        Args:
+            backends (List[TaskBackend]): подключённые трекеры
+            rules (List[RoutingRule], optional): правила маршрутизации
+            queue (PendingTaskQueue, optional): очередь для задач, пока трекер недоступен
+        """
+        if not backends:
+            raise ValueError("Не подключён ни один трекер задач")
+        self.backends = {backend.name: backend for backend in backends}
+        self.rules = rules or []
+        self.queue = queue
+
+    def route(self, text: str, params: Dict[str, Any]) -> List[TaskBackend]:
+        """
+        Возвращает бэкенды для сообщения: объединение всех подошедших правил,
+        иначе правило *, иначе все подключённые бэкенды.
+        """
+        names: List[str] = []
+        for rule in self.rules:
+            if rule.kind != "*" and rule.matches(text, params):
+                names.extend(name for name in rule.backends if name not in names)
+        if not names:
+            fallback = next((rule for rule in self.rules if rule.kind == "*"), None)
+            names = fallback.backends if fallback else list(self.backends)
+        return [self.backends[name] for name in names]
+
+    async def deliver(self, text: str, params: Dict[str, Any], chat_id: Optional[int] = None) -> List[DeliveryResult]:
+        """
+        Создаёт задачу во всех выбранных бэкендах одновременно.
+        Если трекер недоступен, задача откладывается в очередь и будет создана позже.
+        """
+        backends = self.route(text, params)
+        results = await asyncio.gather(
+            *(self._deliver_one(backend, params, chat_id) for backend in backends),
+            return_exceptions=True
+        )
+        delivered = []
+        for backend, result in zip(backends, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error creating task in {backend.title}: {result}")
+                result = DeliveryResult(backend, error=result)
+            delivered.append(result)
+        return delivered
+
+    async def _deliver_one(self, backend: TaskBackend, params: Dict[str, Any],
+                           chat_id: Optional[int]) -> DeliveryResult:
+        # Пока предохранитель разомкнут, даже не пытаемся — сразу в очередь
+        if self.queue is not None and not backend.available:
+            return self._enqueue(backend, params, chat_id)
+        try:
+            return await asyncio.to_thread(backend.create_task, dict(params))
+        except Exception as e:
+            if self.queue is not None and should_queue(e):
+                logger.warning(f"{backend.title} is unavailable, task queued: {e}")
+                return self._enqueue(backend, params, chat_id)
+            raise
+
+    async def enrich(self, results: List[DeliveryResult], params: Dict[str, Any]) -> List[DeliveryResult]:
+        """
+        Дополняет созданные из исходного текста задачи параметрами из LLM во всех бэкендах одновременно.
+        Если уточнить задачу не удалось, остаётся исходный результат — задача уже создана.
+        """
+        async def enrich_one(result: DeliveryResult) -> DeliveryResult:
+            if not result.ok or result.queued or not result.task:
+                return result
+            try:
+                return await asyncio.to_thread(result.backend.enrich_task, result.task, dict(params))
+            except Exception as e:
+                logger.error(f"Error enriching task in {result.backend.title}: {e}")
+                return result
+
+        return list(await asyncio.gather(*(enrich_one(result) for result in results)))
+
+    def _enqueue(self, backend: TaskBackend, params: Dict[str, Any], chat_id: Optional[int]) -> DeliveryResult:
+        self.queue.put(backend.name, params, chat_id)
+        return DeliveryResult(backend, queued=True)
+
+    async def retry_pending(self) -> List[Tuple[Dict[str, Any], DeliveryResult]]:
+        """
+        Повторяет отложенные задачи для трекеров, которые снова доступны.
+        Returns:
+            список (запись очереди, результат) по задачам, которые ушли из очереди
+        """
+        if self.queue is None:
+            return []
+        done = []
+        stalled = set()
+        for entry in self.queue.entries():
+            backend = self.backends.get(entry["backend"])
+            if backend is None:
+                # Трекер отключили в настройках — задачу уже не доставить
+                self.queue.remove(entry)
+                continue
+            if backend.name in stalled or not backend.available:
+                continue
+            try:
+                result = await asyncio.to_thread(backend.create_task, dict(entry["params"]))
+            except Exception as e:
+                if should_queue(e):
+                    stalled.add(backend.name)
+                    continue
+                logger.error(f"Error creating queued task in {backend.title}: {e}")
+                result = DeliveryResult(backend, error=e)
+            self.queue.remove(entry)
+            done.append((entry, result))
+        return done
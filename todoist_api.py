@@ -1,14 +1,28 @@
 import requests
 import os
+import json
 import sys
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 # Импортируем YandexGPT
 from yandex_gpt import YandexGPT
+from circuit_breaker import CircuitBreaker, http_request, is_upstream_failure
+from cached_directory import CachedDirectory, normalize_name
+from due_parser import normalize_due
 
 class TodoistAPI:
-    def __init__(self, api_token: str, default_project_id: Optional[int] = None, default_section_id: Optional[int] = None):
+    def __init__(
+        self,
+        api_token: str,
+        default_project_id: Optional[int] = None,
+        default_section_id: Optional[int] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        timeout: float = 15,
+        timezone_retry_seconds: float = 3600
+    ):
         """
         Initialize Todoist API client
         
@@ -16,11 +30,19 @@ class TodoistAPI:
             api_token (str): Your Todoist API token
             default_project_id (int, optional): Default project ID for new tasks
             default_section_id (int, optional): Default section ID for new tasks
+            breaker (CircuitBreaker, optional): Circuit breaker for all API calls
+            timeout (float): Request timeout in seconds
+            timezone_retry_seconds (float): How long to use local time before retrying a failed timezone lookup
         """
         self.api_token = api_token
+        self.breaker = breaker
+        self.timeout = timeout
         self.default_project_id = default_project_id
         self.default_section_id = default_section_id
         self.base_url = "https://api.todoist.com/api/v1"
+        self.timezone: Optional[str] = None
+        self.timezone_retry_seconds = timezone_retry_seconds
+        self._timezone_retry_at = 0.0
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json"
@@ -101,25 +123,211 @@ class TodoistAPI:
         if due_lang is not None:
             task_data["due_lang"] = due_lang
             
+        self._normalize_due(task_data)
+        return self._post_task(endpoint, task_data, "create")
+
+    def update_task(
+        self,
+        task_id: str,
+        content: Optional[str] = None,
+        description: Optional[str] = None,
+        labels: Optional[List[str]] = None,
+        priority: Optional[int] = None,
+        due_string: Optional[str] = None,
+        due_date: Optional[str] = None,
+        due_datetime: Optional[str] = None,
+        due_lang: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Update an existing task in Todoist (only the provided fields are changed)
+        
+        Args:
+            task_id (str): The task ID
+            content (str, optional): The text of the task
+            description (str, optional): A description for the task
+            labels (List[str], optional): The labels of the task
+            priority (int, optional): The priority of the task (1-4)
+            due_string (str, optional): The due date in natural language
+            due_date (str, optional): The due date in YYYY-MM-DD format
+            due_datetime (str, optional): The due date and time in ISO 8601 format
+            due_lang (str, optional): The language of the due string
+            
+        Returns:
+            Dict[str, Any]: The updated task data
+        """
+        endpoint = f"{self.base_url}/tasks/{task_id}"
+        fields = {
+            "content": content,
+            "description": description,
+            "labels": labels,
+            "priority": priority,
+            "due_string": due_string,
+            "due_date": due_date,
+            "due_datetime": due_datetime,
+            "due_lang": due_lang,
+        }
+        task_data = {key: value for key, value in fields.items() if value is not None}
+        self._normalize_due(task_data)
+        return self._post_task(endpoint, task_data, "update")
+
+    def move_task(self, task_id: str, project_id: Optional[str] = None, section_id: Optional[str] = None) -> None:
+        """
+        Move a task to another project or section (a section implies its project)
+        
+        Args:
+            task_id (str): The task ID
+            project_id (str, optional): Target project ID
+            section_id (str, optional): Target section ID
+        """
+        if section_id is not None:
+            data = {"section_id": section_id}
+        elif project_id is not None:
+            data = {"project_id": project_id}
+        else:
+            return
+        response = self._request("post", f"{self.base_url}/tasks/{task_id}/move", json=data)
+        response.raise_for_status()
+
+    def get_user(self) -> Dict[str, Any]:
+        """
+        Get the current user (including tz_info)
+        
+        Returns:
+            Dict[str, Any]: User data
+        """
+        response = self._request("get", f"{self.base_url}/user")
+        response.raise_for_status()
+        return response.json()
+
+    def user_timezone(self) -> Optional[str]:
+        """
+        IANA timezone of the Todoist user, fetched once and cached.
+        A failed or empty lookup is not repeated for timezone_retry_seconds,
+        so creating tasks meanwhile costs no extra GET /user.
+        
+        Returns:
+            Optional[str]: Timezone name, or None if it is not known (local time is used)
+        """
+        if self.timezone is None and time.monotonic() >= self._timezone_retry_at:
+            try:
+                self.timezone = self.get_user().get("tz_info", {}).get("timezone")
+            except Exception as e:
+                logging.warning(f"Failed to get Todoist user timezone, using local time: {e}")
+            if self.timezone is None:
+                self._timezone_retry_at = time.monotonic() + self.timezone_retry_seconds
+        return self.timezone
+
+    def _normalize_due(self, task_data: Dict[str, Any]) -> None:
+        """
+        Resolve due_string locally into due_date/due_datetime in the user's timezone,
+        so Todoist does not have to parse it (and the request is not retried without it).
+        Expressions the local parser does not fully understand are left to Todoist.
+        """
+        if "due_string" not in task_data or "due_date" in task_data or "due_datetime" in task_data:
+            return
         try:
-            response = requests.post(endpoint, headers=self.headers, json=task_data)
+            now = datetime.now(ZoneInfo(self.user_timezone() or ""))
+        except (ZoneInfoNotFoundError, ValueError):
+            now = datetime.now().astimezone()
+        due = normalize_due(task_data["due_string"], now)
+        if due is None:
+            return
+        task_data.pop("due_string")
+        task_data.pop("due_lang", None)
+        task_data.update(due)
+
+    def _post_task(self, endpoint: str, task_data: Dict[str, Any], action: str) -> Dict[str, Any]:
+        """
+        POST task data, retrying without due_string if Todoist rejects it
+        
+        Raises:
+            Exception: If the API request fails
+        """
+        try:
+            response = self._request("post", endpoint, json=task_data)
             response.raise_for_status()  # Raise an exception for bad status codes
-            print(response.json())
-            return response.json()
+            result = response.json()
+            logging.debug(f"Todoist task {action} response: {result}")
+            return result
         except requests.exceptions.RequestException as e:
-            # Retry logic: if due_string was present, try again without it
-            if due_string is not None:
-                logging.warning(f"Retrying Todoist task creation without due_string due to error: {e}")
+            # Retry logic: if Todoist rejected the due_string, try again without it
+            # (retrying makes no sense when the service itself is failing)
+            if "due_string" in task_data and not is_upstream_failure(e):
+                logging.warning(f"Retrying Todoist task {action} without due_string due to error: {e}")
                 task_data.pop("due_string", None)
                 try:
-                    response = requests.post(endpoint, headers=self.headers, json=task_data)
+                    response = self._request("post", endpoint, json=task_data)
                     response.raise_for_status()
                     result = response.json()
                     result["_due_string_failed"] = True
                     return result
                 except requests.exceptions.RequestException as e2:
-                    raise Exception(f"Failed to create task (even without due_string): {str(e2)}. Original error: {str(e)}")
-            raise Exception(f"Failed to create task: {str(e)}")
+                    raise Exception(f"Failed to {action} task (even without due_string): {str(e2)}. Original error: {str(e)}") from e2
+            raise Exception(f"Failed to {action} task: {str(e)}") from e
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request with the client timeout through the circuit breaker
+        
+        Raises:
+            CircuitOpenError: If the breaker is open and the request was not sent
+        """
+        return http_request(method, url, breaker=self.breaker, timeout=self.timeout, headers=self.headers, **kwargs)
+
+    def ping(self) -> None:
+        """
+        Lightweight health check that bypasses the circuit breaker (used as its probe)
+        
+        Raises:
+            requests.exceptions.RequestException: If Todoist is unavailable
+        """
+        response = http_request("get", f"{self.base_url}/projects", timeout=self.timeout,
+                                headers=self.headers, params={"limit": 1})
+        response.raise_for_status()
+
+    def sync(self, sync_token: str = "*", resource_types: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Incremental read through the Sync API
+        
+        Args:
+            sync_token (str): Token from the previous sync; "*" requests a full sync
+            resource_types (List[str], optional): Resources to sync, e.g. ["items", "projects"]
+            
+        Returns:
+            Dict[str, Any]: Changed resources, the new sync_token and the full_sync flag
+        """
+        data = {
+            "sync_token": sync_token,
+            "resource_types": json.dumps(resource_types or ["all"]),
+        }
+        # The Sync endpoint takes form data, so the JSON Content-Type header is not sent here
+        response = http_request("post", f"{self.base_url}/sync", breaker=self.breaker, timeout=self.timeout,
+                                headers={"Authorization": self.headers["Authorization"]}, data=data)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_all(self, path: str, params: Optional[Dict[str, Any]] = None, page_size: int = 200) -> List[Dict[str, Any]]:
+        """
+        Get all items of a paginated list endpoint, following next_cursor
+        
+        Args:
+            path (str): Resource path, e.g. "/projects"
+            params (dict, optional): Extra query parameters
+            page_size (int): Page size (Todoist maximum is 200)
+            
+        Returns:
+            List[Dict[str, Any]]: Items from all pages
+        """
+        query = dict(params or {}, limit=page_size)
+        items: List[Dict[str, Any]] = []
+        while True:
+            response = self._request("get", f"{self.base_url}{path}", params=query)
+            response.raise_for_status()
+            data = response.json()
+            items.extend(data.get("results", []))
+            if not data.get("next_cursor"):
+                return items
+            query["cursor"] = data["next_cursor"]
 
     def get_projects(self) -> List[Dict[str, Any]]:
         """
@@ -128,10 +336,7 @@ class TodoistAPI:
         Returns:
             List[Dict[str, Any]]: List of projects
         """
-        endpoint = f"{self.base_url}/projects"
-        response = requests.get(endpoint, headers=self.headers)
-        response.raise_for_status()
-        return response.json()['results']
+        return self._get_all("/projects")
 
     def get_project_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """
@@ -175,14 +380,10 @@ class TodoistAPI:
         Returns:
             List[Dict[str, Any]]: List of sections
         """
-        endpoint = f"{self.base_url}/sections"
         params = {}
         if project_id is not None:
             params["project_id"] = project_id
-        
-        response = requests.get(endpoint, headers=self.headers, params=params)
-        response.raise_for_status()
-        return response.json()['results']
+        return self._get_all("/sections", params)
 
     def get_section_by_name(self, name: str, project_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
@@ -218,6 +419,28 @@ class TodoistAPI:
                 return section
         return None
 
+    def resolve_project_and_section(
+        self,
+        project_name: Optional[str],
+        section_name: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Resolve project and section names (e.g. extracted by LLM) to Todoist objects
+        
+        Args:
+            project_name (str, optional): Project name
+            section_name (str, optional): Section name within the project
+            
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]: Project and section data (None if not found)
+        """
+        if not project_name:
+            return None, None
+        project = self.get_project_by_name(project_name)
+        if not project or not section_name:
+            return project, None
+        return project, self.get_section_by_name(section_name, project['id'])
+
     def get_default_section(self, project_id: int) -> Optional[Dict[str, Any]]:
         """
         Get the first section (default column) of a project
@@ -233,6 +456,76 @@ class TodoistAPI:
             return sections[0]  # Первая колонка обычно является дефолтной
         return None
 
+class TodoistDirectory(CachedDirectory):
+    """
+    Local directory of Todoist projects and sections.
+    Loaded once (with pagination), kept in memory indexed by id and name, refreshed in the background
+    after the TTL and snapshotted to disk, so resolving names extracted by LLM costs no API calls.
+    """
+    title = "Todoist"
+
+    def __init__(self, api: TodoistAPI, ttl: int = 3600, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            api (TodoistAPI): Todoist client
+            ttl (int): Directory lifetime in seconds
+            snapshot_path (str, optional): Path to the JSON snapshot on disk
+        """
+        self.api = api
+        super().__init__(ttl=ttl, snapshot_path=snapshot_path)
+
+    def _fetch(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "projects": self.api.get_projects(),
+            "sections": self.api.get_sections(),
+        }
+
+    def _index(self, data: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Archived and deleted projects are not valid targets for new tasks
+        projects = [p for p in data.get("projects", []) if not p.get("is_archived") and not p.get("is_deleted")]
+        sections = [s for s in data.get("sections", []) if not s.get("is_archived") and not s.get("is_deleted")]
+
+        projects_by_name: Dict[str, Dict[str, Any]] = {}
+        for project in projects:
+            projects_by_name.setdefault(normalize_name(project.get("name", "")), project)
+        sections_by_project: Dict[str, List[Dict[str, Any]]] = {}
+        for section in sections:
+            sections_by_project.setdefault(section.get("project_id"), []).append(section)
+
+        # Swap the indexes as a whole so readers never see a half-updated state
+        self.projects = projects
+        self.projects_by_id = {p["id"]: p for p in projects}
+        self.projects_by_name = projects_by_name
+        self.sections_by_id = {s["id"]: s for s in sections}
+        self.sections_by_project = sections_by_project
+
+    def resolve(
+        self,
+        project_name: Optional[str],
+        section_name: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Resolve project and section names to Todoist objects without API calls
+        
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]: Project and section data (None if not found)
+        """
+        if not project_name:
+            return None, None
+        self.ensure_fresh()
+        project = self.projects_by_name.get(normalize_name(project_name))
+        if not project or not section_name:
+            return project, None
+        key = normalize_name(section_name)
+        for section in self.sections_by_project.get(project["id"], []):
+            if normalize_name(section.get("name", "")) == key:
+                return project, section
+        return project, None
+
+    def project_of(self, section: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Project the section belongs to"""
+        return self.projects_by_id.get(section.get("project_id"))
+
 def main():
     # Проверяем наличие токена в переменных окружения
     api_token = os.getenv('TODOIST_TOKEN')
@@ -0,0 +1,259 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, date, tzinfo
+from typing import Optional, List, Dict, Any, Set
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from todoist_api import TodoistAPI
+from cached_directory import save_json
+
+logger = logging.getLogger(__name__)
+
+SYNC_RESOURCES = ["items", "projects", "user"]
+_WORD_RE = re.compile(r"\w+")
+
+
+def _words(text: str) -> Set[str]:
+    return {word.lower().replace("ё", "е") for word in _WORD_RE.findall(text or "")}
+
+
+class TodoistReplica:
+    """
+    Локальная реплика активных задач Todoist для команд чтения (/today, /inbox, /search).
+    Первый раз загружается полной синхронизацией Sync API, дальше получает только изменения по sync_token.
+    Задачи проиндексированы по дню срока, проекту, метке и словам текста, поэтому ответы не зависят
+    от размера аккаунта. Состояние сохраняется на диск, чтобы после перезапуска не делать полную синхронизацию.
+    """
+
+    def __init__(self, api: TodoistAPI, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            api (TodoistAPI): клиент Todoist
+            snapshot_path (str, optional): путь к JSON-снимку реплики на диске
+        """
+        self.api = api
+        self.snapshot_path = snapshot_path
+        self.sync_token = "*"
+        self.timezone: Optional[str] = None
+        self._lock = threading.Lock()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        self.by_due: Dict[str, Set[str]] = {}
+        self.by_project: Dict[str, Set[str]] = {}
+        self.by_label: Dict[str, Set[str]] = {}
+        self.by_word: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    @property
+    def loaded(self) -> bool:
+        return self.sync_token != "*"
+
+    def _zone(self) -> Optional[tzinfo]:
+        """Часовой пояс пользователя Todoist (None — системный)"""
+        try:
+            return ZoneInfo(self.timezone) if self.timezone else None
+        except (ZoneInfoNotFoundError, ValueError):
+            return None
+
+    def due_local(self, task: Dict[str, Any]) -> str:
+        """
+        Срок задачи в часовом поясе пользователя: YYYY-MM-DD или YYYY-MM-DDTHH:MM:SS (пусто, если срока нет).
+        Сроки с фиксированным часовым поясом Todoist отдаёт в UTC с суффиксом Z — переводим их в местное время.
+        """
+        value = (task.get("due") or {}).get("date") or ""
+        if not value.endswith("Z"):
+            return value
+        try:
+            moment = datetime.fromisoformat(value[:-1] + "+00:00")
+        except ValueError:
+            return value
+        return moment.astimezone(self._zone()).strftime("%Y-%m-%dT%H:%M:%S")
+
+    def _due_day(self, task: Dict[str, Any]) -> Optional[str]:
+        """День срока задачи в часовом поясе пользователя в виде YYYY-MM-DD"""
+        return self.due_local(task)[:10] or None
+
+    def _unindex(self, task_id: str) -> None:
+        # Вызывается под self._lock
+        task = self.items.pop(task_id, None)
+        if task is None:
+            return
+        keys = [(self.by_due, self._due_day(task)), (self.by_project, task.get("project_id"))]
+        keys += [(self.by_label, label) for label in task.get("labels") or []]
+        keys += [(self.by_word, word) for word in _words(f"{task.get('content')} {task.get('description')}")]
+        for index, key in keys:
+            ids = index.get(key)
+            if ids is None:
+                continue
+            ids.discard(task_id)
+            if not ids:
+                del index[key]
+                self._vocabulary_dirty |= index is self.by_word
+
+    def _index(self, task: Dict[str, Any]) -> None:
+        # Вызывается под self._lock
+        task_id = task["id"]
+        self._unindex(task_id)
+        # В реплике только активные задачи: выполненные и удалённые из неё убираются
+        if task.get("checked") or task.get("is_deleted"):
+            return
+        self.items[task_id] = task
+        day = self._due_day(task)
+        if day:
+            self.by_due.setdefault(day, set()).add(task_id)
+        self.by_project.setdefault(task.get("project_id"), set()).add(task_id)
+        for label in task.get("labels") or []:
+            self.by_label.setdefault(label, set()).add(task_id)
+        for word in _words(f"{task.get('content')} {task.get('description')}"):
+            if word not in self.by_word:
+                self._vocabulary_dirty = True
+            self.by_word.setdefault(word, set()).add(task_id)
+
+    def _apply(self, data: Dict[str, Any]) -> None:
+        # Вызывается под self._lock
+        if data.get("full_sync"):
+            self.items, self.projects = {}, {}
+            self.by_due, self.by_project, self.by_label, self.by_word = {}, {}, {}, {}
+            self._vocabulary_dirty = True
+        for project in data.get("projects", []):
+            if project.get("is_deleted") or project.get("is_archived"):
+                self.projects.pop(project["id"], None)
+            else:
+                self.projects[project["id"]] = project
+        # Часовой пояс нужен раньше задач: по нему определяется день срока в индексе
+        timezone = ((data.get("user") or {}).get("tz_info") or {}).get("timezone")
+        if timezone and timezone != self.timezone:
+            self.timezone = timezone
+            self._reindex_due()
+        for task in data.get("items", []):
+            self._index(task)
+
+    def _reindex_due(self) -> None:
+        # Вызывается под self._lock: часовой пояс сменился, дни сроков с временем в UTC могли сдвинуться
+        self.by_due = {}
+        for task_id, task in self.items.items():
+            day = self._due_day(task)
+            if day:
+                self.by_due.setdefault(day, set()).add(task_id)
+
+    def apply_task(self, task: Dict[str, Any]) -> None:
+        """Учесть задачу, созданную или изменённую ботом, не дожидаясь следующей синхронизации"""
+        if not task.get("id"):
+            return
+        with self._lock:
+            self._index(task)
+
+    def sync(self) -> bool:
+        """
+        Получить изменения с прошлой синхронизации (в первый раз — все задачи)
+        Returns:
+            bool: True, если что-то изменилось
+        """
+        data = self.api.sync(self.sync_token, SYNC_RESOURCES)
+        changed = bool(data.get("full_sync") or data.get("items") or data.get("projects"))
+        with self._lock:
+            self._apply(data)
+            self.sync_token = data.get("sync_token", self.sync_token)
+        # Синхронизация приносит и часовой пояс пользователя — клиенту он нужен для разбора сроков
+        if self.timezone:
+            self.api.timezone = self.timezone
+        if changed:
+            self._save_snapshot()
+            logger.info(f"Todoist replica synced: {len(self.items)} active tasks")
+        return changed
+
+    def load_snapshot(self) -> bool:
+        """Загрузить реплику из снимка на диске. Возвращает True, если снимок найден"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать снимок реплики Todoist: {e}")
+            return False
+        with self._lock:
+            self._apply({
+                "full_sync": True,
+                "items": snapshot.get("items", []),
+                "projects": snapshot.get("projects", []),
+                "user": {"tz_info": {"timezone": snapshot.get("timezone")}},
+            })
+            self.sync_token = snapshot.get("sync_token", "*")
+        return True
+
+    def _save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            snapshot = {
+                "sync_token": self.sync_token,
+                "timezone": self.timezone,
+                "items": list(self.items.values()),
+                "projects": list(self.projects.values()),
+            }
+        save_json(self.snapshot_path, snapshot, "снимок реплики Todoist")
+
+    def today(self) -> date:
+        """Сегодняшняя дата в часовом поясе пользователя Todoist"""
+        return datetime.now(self._zone()).date()
+
+    def _tasks(self, ids) -> List[Dict[str, Any]]:
+        # Сначала по сроку (задачи со временем — по времени), затем по приоритету (4 — самый высокий)
+        tasks = [self.items[task_id] for task_id in ids if task_id in self.items]
+        return sorted(tasks, key=lambda t: (self.due_local(t) or "9999", -t.get("priority", 1),
+                                            t.get("child_order", 0)))
+
+    def due_until(self, day: date) -> List[Dict[str, Any]]:
+        """Задачи со сроком не позже day (включая просроченные)"""
+        key = day.isoformat()
+        with self._lock:
+            ids = set().union(*(ids for due, ids in self.by_due.items() if due <= key))
+            return self._tasks(ids)
+
+    def inbox_project(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((p for p in self.projects.values() if p.get("inbox_project")), None)
+
+    def in_project(self, project_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._tasks(self.by_project.get(project_id, set()))
+
+    def with_label(self, label: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._tasks(self.by_label.get(label, set()))
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Поиск по тексту и описанию задач: каждое слово запроса должно встречаться в задаче
+        (как слово или начало слова), а слова вида @метка отбирают задачи с этой меткой
+        """
+        labels = [word[1:] for word in query.split() if word.startswith("@") and len(word) > 1]
+        words = _words(" ".join(word for word in query.split() if not word.startswith("@")))
+        if not words and not labels:
+            return []
+        with self._lock:
+            if self._vocabulary_dirty:
+                self._vocabulary = sorted(self.by_word)
+                self._vocabulary_dirty = False
+            result: Optional[Set[str]] = None
+            for label in labels:
+                ids = self.by_label.get(label, set())
+                result = set(ids) if result is None else result & ids
+            for word in words:
+                ids = set()
+                start = bisect.bisect_left(self._vocabulary, word)
+                for vocabulary_word in self._vocabulary[start:]:
+                    if not vocabulary_word.startswith(word):
+                        break
+                    ids |= self.by_word[vocabulary_word]
+                result = ids if result is None else result & ids
+            return self._tasks(result or set())
+
+    def project_name(self, project_id: str) -> str:
+        return self.projects.get(project_id, {}).get("name", "")
@@ -1,21 +1,42 @@
-import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import json
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from circuit_breaker import CircuitBreaker, http_request
+
+# Описание ключей общего извлечения параметров задачи (используется в одиночном и пакетном промптах)
+TASK_PARAMS_KEYS = """content (текст задачи),
+due_string (срок, если есть; может быть в формате "завтра", "сегодня", "послезавтра" и или в формате даты, например, "2025-06-30"),
+priority (1-4, если есть),
+labels (список, если есть),
+project_name (название проекта в котором нужно создать задачу, если упоминается в тексте; не перепутай с названием задачи или проекта, по которому создаем задачу),
+section_name (название колонки в проекте, если упоминается в тексте; например "В работе", "Готово", "Бэклог")."""
 
 class YandexGPT:
-    def __init__(self, apikey: str, folder_id: str, todoist_client=None):
+    def __init__(self, apikey: str, folder_id: str, todoist_client=None,
+                 breaker: Optional[CircuitBreaker] = None, timeout: float = 30):
         self.apikey = apikey
         self.folder_id = folder_id
         self.api_url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+        self.tokenize_url = "https://llm.api.cloud.yandex.net/foundationModels/v1/tokenize"
         self.todoist_client = todoist_client
-
-    def ask(self, prompt: str, max_tokens: int = 300) -> str:
-        headers = {
+        self.breaker = breaker
+        self.timeout = timeout
+        self.headers = {
             "Authorization": f"Api-Key {self.apikey}",
             "Content-Type": "application/json"
         }
+
+    def ping(self) -> None:
+        """
+        Проверка доступности модели через бесплатный tokenize (в обход предохранителя, используется как его проба)
+        """
+        data = {"modelUri": f"gpt://{self.folder_id}/yandexgpt/latest", "text": "ping"}
+        response = http_request("post", self.tokenize_url, timeout=self.timeout, headers=self.headers, json=data)
+        response.raise_for_status()
+
+    def ask(self, prompt: str, max_tokens: int = 300) -> str:
         data = {
             "modelUri": f"gpt://{self.folder_id}/yandexgpt/latest",
             "completionOptions": {
@@ -27,30 +48,26 @@ class YandexGPT:
                 {"role": "user", "text": prompt}
             ]
         }
-        response = requests.post(self.api_url, headers=headers, json=data)
+        response = http_request("post", self.api_url, breaker=self.breaker, timeout=self.timeout,
+                                headers=self.headers, json=data)
         response.raise_for_status()
         result = response.json()
         return result["result"]["alternatives"][0]["message"]["text"]
 
-    def extract_todoist_task_params(self, text: str) -> Dict[str, Any]:
+    def extract_task_params(self, text: str) -> Dict[str, Any]:
         """
-        Извлекает параметры для создания задачи в Todoist и преобразует их в формат API
+        Извлекает общие параметры задачи (без привязки к конкретному трекеру)
         
         Args:
             text (str): Пользовательский текст
             
         Returns:
-            Dict[str, Any]: Параметры для API Todoist (с project_id, section_id вместо project_name, section_name)
+            Dict[str, Any]: content, description и, если найдены, due_string, priority, labels, project_name, section_name
         """
         prompt = f"""
-Ты — помощник, который извлекает параметры для создания задачи в Todoist из пользовательского текста. 
+Ты — помощник, который извлекает параметры для создания задачи из пользовательского текста. 
 Верни результат в формате JSON с ключами:
-content (текст задачи),
-due_string (срок, если есть; может быть в формате "завтра", "сегодня", "послезавтра" и или в формате даты, например, "2025-06-30"),
-priority (1-4, если есть),
-labels (список, если есть),
-project_name (название проекта в котором нужно создать задачу, если упоминается в тексте; не перепутай с названием задачи или проекта, по которому создаем задачу),
-section_name (название колонки в проекте, если упоминается в тексте; например "В работе", "Готово", "Бэклог").
+{TASK_PARAMS_KEYS}
 
 Если параметр не найден — не включай его в JSON. Но content заполняй всегда! Даже если понять смысловую часть задачи не просто, небольшой текст всегда лучше, чем ничего.
 
@@ -74,21 +91,90 @@ section_name (название колонки в проекте, если упо
         match = re.search(r'\{.*\}', answer, re.DOTALL)
         if match:
             try:
-                params = json.loads(match.group(0))
-                params['description'] = text.strip()
-                # Проверяем, что есть ключ 'content'
-                if 'content' not in params:
-                    params['content'] = "Новая задача"
-                
-                # Преобразуем project_name и section_name в project_id и section_id
-                params = self._resolve_project_and_section_ids(params)
-                
-                return params
+                return self._complete_task_params(json.loads(match.group(0)), text)
             except Exception:
                 pass
         # Если не удалось распарсить JSON или нет ключа content, возвращаем дефолт
-        default_params = {"content": "Новая задача", "description": text.strip()}
-        return self._resolve_project_and_section_ids(default_params)
+        return {"content": "Новая задача", "description": text.strip()}
+
+    @staticmethod
+    def _complete_task_params(params: Dict[str, Any], text: str) -> Dict[str, Any]:
+        if not isinstance(params, dict):
+            raise ValueError("LLM вернула не объект")
+        params['description'] = text.strip()
+        # Проверяем, что есть ключ 'content'
+        if 'content' not in params:
+            params['content'] = "Новая задача"
+        return params
+
+    def extract_task_params_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Извлекает параметры сразу для нескольких сообщений одним запросом к LLM
+        
+        Args:
+            texts (List[str]): Тексты сообщений, каждое — отдельная задача
+            
+        Returns:
+            List[Dict[str, Any]]: Параметры в том же порядке, что и texts (формат как у extract_task_params)
+        """
+        if len(texts) == 1:
+            return [self.extract_task_params(texts[0])]
+        items = "\n".join(f"{i}. {text.strip()}" for i, text in enumerate(texts, 1))
+        prompt = f"""
+Ты — помощник, который извлекает параметры для создания задач из пользовательских сообщений.
+Ниже пронумерованные сообщения, каждое сообщение — отдельная задача.
+Верни JSON-массив, по одному объекту на каждое сообщение, в том же порядке. В каждом объекте ключ index (номер сообщения) и ключи:
+{TASK_PARAMS_KEYS}
+
+Если параметр не найден — не включай его в объект. Но content заполняй всегда! Даже если понять смысловую часть задачи не просто, небольшой текст всегда лучше, чем ничего.
+
+Пример:
+Вход:
+1. Завтра купить молоко, важно
+2. Сделать отчёт в проекте "Работа"
+Выход: [{{"index": 1, "content": "Купить молоко", "due_string": "завтра", "priority": 4}}, {{"index": 2, "content": "Сделать отчёт", "project_name": "Работа"}}]
+
+Вход:
+{items}
+Выход:
+"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        # Ошибки самого запроса (таймаут, отказ сервиса, разомкнутый предохранитель) пробрасываем:
+        # повторять запросы по одному бессмысленно, вызывающий код сразу создаст задачи из исходного текста
+        answer = self.ask(prompt, max_tokens=min(300 * len(texts), 4000))
+        match = re.search(r'\[.*\]', answer, re.DOTALL)
+        try:
+            items = json.loads(match.group(0)) if match else []
+        except ValueError as e:
+            logging.warning(f"Batch extraction returned malformed JSON: {e}")
+            items = []
+        for position, params in enumerate(items if isinstance(items, list) else []):
+            if not isinstance(params, dict):
+                continue
+            index = params.pop('index', position + 1)
+            if isinstance(index, int) and 1 <= index <= len(texts) and results[index - 1] is None:
+                results[index - 1] = self._complete_task_params(params, texts[index - 1])
+
+        # Сообщения, которые LLM пропустила или вернула некорректно, разбираем отдельными запросами параллельно
+        missing = [i for i, params in enumerate(results) if params is None]
+        if missing:
+            logging.warning(f"Batch extraction missed {len(missing)} of {len(texts)} messages, extracting them separately")
+            with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                for i, params in zip(missing, pool.map(self.extract_task_params, [texts[i] for i in missing])):
+                    results[i] = params
+        return results
+
+    def extract_todoist_task_params(self, text: str) -> Dict[str, Any]:
+        """
+        Извлекает параметры для создания задачи в Todoist и преобразует их в формат API
+        
+        Args:
+            text (str): Пользовательский текст
+            
+        Returns:
+            Dict[str, Any]: Параметры для API Todoist (с project_id, section_id вместо project_name, section_name)
+        """
+        return self._resolve_project_and_section_ids(self.extract_task_params(text))
 
     def _resolve_project_and_section_ids(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -104,23 +190,13 @@ section_name (название колонки в проекте, если упо
             # Если клиент не передан, возвращаем как есть
             return params
         
-        # Обрабатываем project_name
-        if 'project_name' in params:
-            project_name = params.pop('project_name')
-            project = self.todoist_client.get_project_by_name(project_name)
-            if project:
-                params['project_id'] = project['id']
-                
-                # Обрабатываем section_name, если есть
-                if 'section_name' in params:
-                    section_name = params.pop('section_name')
-                    section = self.todoist_client.get_section_by_name(section_name, project['id'])
-                    if section:
-                        params['section_id'] = section['id']
-        
-        # Удаляем section_name, если он остался (проект не найден или секция не найдена)
-        if 'section_name' in params:
-            params.pop('section_name')
+        project, section = self.todoist_client.resolve_project_and_section(
+            params.pop('project_name', None), params.pop('section_name', None)
+        )
+        if project:
+            params['project_id'] = project['id']
+        if section:
+            params['section_id'] = section['id']
 
         return params
 
@@ -1,16 +1,22 @@
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging, json
+from circuit_breaker import CircuitBreaker, http_request
+from cached_directory import CachedDirectory, normalize_name
 
 class YougileAPI:
-    def __init__(self, api_key: str, location: str):
+    def __init__(self, api_key: str, location: str, breaker: Optional[CircuitBreaker] = None, timeout: float = 15):
         """
         Инициализация клиента Yougile API
         Args:
             api_key (str): API-ключ Yougile
             location (str): ID колонки по умолчанию (обязательный)
+            breaker (CircuitBreaker, optional): предохранитель для всех запросов к API
+            timeout (float): таймаут запроса в секундах
         """
         self.api_key = api_key
+        self.breaker = breaker
+        self.timeout = timeout
         self.base_url = "https://yougile.com/api-v2"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -21,13 +27,15 @@ class YougileAPI:
     def create_task(
         self,
         title: str,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        column_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Создать задачу в Yougile (api-v2)
         Args:
             title (str): Название задачи
             description (str, optional): Описание задачи (html)
+            column_id (str, optional): ID колонки; по умолчанию колонка из location
         Returns:
             dict: Данные созданной задачи (id и result)
         Raises:
@@ -36,17 +44,205 @@ class YougileAPI:
         endpoint = f"{self.base_url}/tasks"
         task_data = {
             "title": title,
-            "columnId": self.location
+            "columnId": column_id or self.location
         }
         if description is not None:
             task_data["description"] = description
 
-        response = requests.post(endpoint, headers=self.headers, json=task_data)
+        response = self._request("post", endpoint, json=task_data)
         data = response.json()
         if not data.get("id"):
             raise Exception(f"Yougile API error: {data.get('message', 'Unknown error')}")
         return data
 
+    def update_task(
+        self,
+        task_id: str,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        column_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Изменить задачу в Yougile (api-v2), меняются только переданные поля
+        Args:
+            task_id (str): ID задачи
+            title (str, optional): Новое название
+            description (str, optional): Новое описание (html)
+            column_id (str, optional): ID колонки, в которую перенести задачу
+        Returns:
+            dict: Ответ API (id задачи)
+        Raises:
+            Exception: Если API вернул ошибку
+        """
+        fields = {"title": title, "description": description, "columnId": column_id}
+        task_data = {key: value for key, value in fields.items() if value is not None}
+        response = self._request("put", f"{self.base_url}/tasks/{task_id}", json=task_data)
+        data = response.json()
+        if not data.get("id"):
+            raise Exception(f"Yougile API error: {data.get('message', 'Unknown error')}")
+        return data
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Запрос к API с таймаутом клиента через предохранитель
+        Raises:
+            CircuitOpenError: если предохранитель разомкнут и запрос не отправлялся
+        """
+        return http_request(method, url, breaker=self.breaker, timeout=self.timeout, headers=self.headers, **kwargs)
+
+    def ping(self) -> None:
+        """
+        Лёгкая проверка доступности API в обход предохранителя (используется как его проба)
+        Raises:
+            requests.exceptions.RequestException: если Yougile недоступен
+        """
+        response = http_request("get", f"{self.base_url}/projects", timeout=self.timeout,
+                                headers=self.headers, params={"limit": 1})
+        response.raise_for_status()
+
+    def _get_all(self, path: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Получить все записи списка api-v2, проходя по страницам (limit/offset)
+        Args:
+            path (str): путь ресурса, например "/boards"
+            page_size (int): размер страницы (максимум Yougile — 1000)
+        Returns:
+            list: записи из поля content всех страниц
+        """
+        items: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            response = self._request("get", f"{self.base_url}{path}", params={"limit": page_size, "offset": offset})
+            response.raise_for_status()
+            data = response.json()
+            page = data.get("content", [])
+            items.extend(page)
+            if not data.get("paging", {}).get("next") or not page:
+                return items
+            offset += len(page)
+
+    def get_projects(self) -> List[Dict[str, Any]]:
+        """Получить все проекты компании"""
+        return self._get_all("/projects")
+
+    def get_boards(self) -> List[Dict[str, Any]]:
+        """Получить все доски (у каждой есть projectId)"""
+        return self._get_all("/boards")
+
+    def get_columns(self) -> List[Dict[str, Any]]:
+        """Получить все колонки (у каждой есть boardId)"""
+        return self._get_all("/columns")
+
+
+class YougileDirectory(CachedDirectory):
+    """
+    Локальный справочник проектов, досок и колонок Yougile.
+    Загружается целиком один раз (с пагинацией), хранится в памяти с индексами по id и названию,
+    обновляется в фоне по истечении TTL и сохраняется на диск, чтобы после перезапуска не ходить в API.
+    Разрешение названий из LLM в columnId не делает запросов к API.
+    """
+    title = "Yougile"
+
+    def __init__(self, api: YougileAPI, ttl: int = 3600, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            api (YougileAPI): клиент Yougile
+            ttl (int): время жизни справочника в секундах
+            snapshot_path (str, optional): путь к JSON-снимку на диске
+        """
+        self.api = api
+        super().__init__(ttl=ttl, snapshot_path=snapshot_path)
+
+    def _fetch(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "projects": self.api.get_projects(),
+            "boards": self.api.get_boards(),
+            "columns": self.api.get_columns(),
+        }
+
+    def _index(self, data: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Удалённые объекты Yougile тоже отдаёт в списках — в справочник их не берём
+        projects = [p for p in data.get("projects", []) if not p.get("deleted")]
+        boards = [b for b in data.get("boards", []) if not b.get("deleted")]
+        columns = [c for c in data.get("columns", []) if not c.get("deleted")]
+
+        projects_by_id = {p["id"]: p for p in projects}
+        boards_by_id = {b["id"]: b for b in boards}
+        boards_by_title: Dict[str, List[Dict[str, Any]]] = {}
+        boards_by_project: Dict[str, List[Dict[str, Any]]] = {}
+        for board in boards:
+            boards_by_title.setdefault(normalize_name(board.get("title", "")), []).append(board)
+            boards_by_project.setdefault(board.get("projectId"), []).append(board)
+        projects_by_title: Dict[str, List[Dict[str, Any]]] = {}
+        for project in projects:
+            projects_by_title.setdefault(normalize_name(project.get("title", "")), []).append(project)
+        columns_by_id = {c["id"]: c for c in columns}
+        columns_by_board: Dict[str, List[Dict[str, Any]]] = {}
+        columns_by_title: Dict[str, List[Dict[str, Any]]] = {}
+        for column in columns:
+            columns_by_board.setdefault(column.get("boardId"), []).append(column)
+            columns_by_title.setdefault(normalize_name(column.get("title", "")), []).append(column)
+
+        # Подменяем индексы целиком, чтобы читатели не видели полуобновлённое состояние
+        self.projects_by_id = projects_by_id
+        self.projects_by_title = projects_by_title
+        self.boards_by_id = boards_by_id
+        self.boards_by_title = boards_by_title
+        self.boards_by_project = boards_by_project
+        self.columns_by_id = columns_by_id
+        self.columns_by_board = columns_by_board
+        self.columns_by_title = columns_by_title
+
+    def find_board(self, name: str) -> Optional[Dict[str, Any]]:
+        """Найти доску по названию; если доски нет, берём единственную доску одноимённого проекта"""
+        self.ensure_fresh()
+        key = normalize_name(name)
+        boards = self.boards_by_title.get(key)
+        if boards:
+            return boards[0]
+        for project in self.projects_by_title.get(key, []):
+            project_boards = self.boards_by_project.get(project["id"], [])
+            if len(project_boards) == 1:
+                return project_boards[0]
+        return None
+
+    def resolve_column(
+        self,
+        board_name: Optional[str] = None,
+        column_name: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Разрешить названия доски и колонки (например, извлечённые LLM) в колонку без запросов к API
+        Args:
+            board_name (str, optional): название доски (или проекта с одной доской)
+            column_name (str, optional): название колонки
+        Returns:
+            dict: колонка (id, title, boardId) или None, если однозначно определить не удалось
+        """
+        if not board_name and not column_name:
+            return None
+        self.ensure_fresh()
+        board = self.find_board(board_name) if board_name else None
+        if board:
+            columns = self.columns_by_board.get(board["id"], [])
+            if column_name:
+                key = normalize_name(column_name)
+                for column in columns:
+                    if normalize_name(column.get("title", "")) == key:
+                        return column
+            # Колонка не указана или не найдена — первая колонка доски
+            return columns[0] if columns else None
+        if column_name:
+            # Доска не указана: подходит только колонка с уникальным названием
+            columns = self.columns_by_title.get(normalize_name(column_name), [])
+            if len(columns) == 1:
+                return columns[0]
+        return None
+
+    def board_of(self, column: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Доска, которой принадлежит колонка"""
+        return self.boards_by_id.get(column.get("boardId"))
+
 if __name__ == "__main__":
     import os
     import sys